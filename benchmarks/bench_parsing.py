@@ -0,0 +1,77 @@
+"""
+Benchmarks of every parsing step of a search, against the synthetic full-weight pages
+in `benchmarks.corpus`, for each installed parser backend and for small and large
+results tables.
+
+Run with ``make benchmark``, which saves each run and fails when the fastest time of
+a benchmark gets more than 25% slower than in the previous saved run. Peak memory of
+one call is in each benchmark's extra info, and has a fixed budget per step.
+"""
+
+import datetime
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from wg_gesucht.page import Page  # noqa: E402
+from benchmarks import corpus  # noqa: E402
+
+# peak memory budgets in KiB for pages of a real page's weight, generous enough for
+# every backend
+SMALL_PAGE_BUDGET = 4096
+RESULTS_TABLE_BUDGET = {"small": 4096, "large": 65536}
+
+
+def test_no_captcha(crawler, measure, table_size):
+    content = crawler.pages[corpus.LIST_URL]
+
+    def no_captcha():
+        return crawler.no_captcha(Page(corpus.LIST_URL, content, parser=crawler.parser))
+
+    assert measure(no_captcha, RESULTS_TABLE_BUDGET[table_size])
+
+
+def test_fetch_filters(crawler, measure):
+    assert len(measure(crawler.fetch_filters, SMALL_PAGE_BUDGET)) == 3
+
+
+def test_retrieve_email_template(crawler, measure):
+    assert measure(crawler.retrieve_email_template, SMALL_PAGE_BUDGET).startswith("Hallo,")
+
+
+def test_change_to_list_details_view(crawler, measure, table_size):
+    def change_to_list_details_view():
+        page = crawler.change_to_list_details_view(crawler.get_page(corpus.GALLERY_URL))
+        return crawler.parse_search_results(page.results_tree)
+
+    search_results, next_button_href = measure(
+        change_to_list_details_view, RESULTS_TABLE_BUDGET[table_size]
+    )
+    assert len(search_results) == corpus.TABLE_SIZES[table_size]
+
+
+def test_process_filter_results(crawler, measure, table_size):
+    page = crawler.get_page(corpus.LIST_URL)
+    search_results, next_button_href = crawler.parse_search_results(page.results_tree)
+
+    ads = measure(
+        lambda: crawler.process_filter_results(search_results, corpus.GALLERY_URL),
+        RESULTS_TABLE_BUDGET[table_size],
+    )
+    assert ads and ads[0].post_date == datetime.date.today()
+
+
+def test_get_info_from_ad(crawler, measure):
+    ad = measure(lambda: crawler.get_info_from_ad(corpus.AD_URL), SMALL_PAGE_BUDGET)
+    assert ad.contact_url == corpus.MESSENGER_URL
+
+
+def test_get_payload(crawler, measure):
+    content = crawler.pages[corpus.MESSENGER_URL]
+
+    def get_payload():
+        page = Page(corpus.MESSENGER_URL, content, parser=crawler.parser)
+        return crawler.get_payload(crawler.parser.messenger_form(page.tree), "Hallo!")
+
+    assert measure(get_payload, SMALL_PAGE_BUDGET)["ad_id"] == "1000005"
@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+import tracemalloc
+
+import pytest
+
+from wg_gesucht.page import Page
+from wg_gesucht.parsers import PARSERS, get_parser
+from tests.stub_server import make_crawler
+from benchmarks import corpus
+
+
+def available_parsers():
+    names = list()
+    for name in PARSERS:
+        try:
+            get_parser(name)
+        except Exception:
+            continue
+        names.append(name)
+    return names
+
+
+@pytest.fixture(params=available_parsers())
+def parser_name(request):
+    return request.param
+
+
+@pytest.fixture(params=sorted(corpus.TABLE_SIZES))
+def table_size(request):
+    return request.param
+
+
+@pytest.fixture
+def crawler(request, parser_name):
+    """
+    A crawler whose `get_page` serves the synthetic corpus pages, so a benchmark measures the
+    parsing and none of the network or rate limiting. Benchmarks which take the
+    `table_size` fixture run against both results tables, the others only the small one.
+    """
+    table_size = "small"
+    if "table_size" in request.fixturenames:
+        table_size = request.getfixturevalue("table_size")
+    folder = tempfile.mkdtemp()
+    crawler = make_crawler(folder, base_url=corpus.BASE_URL, parser=parser_name)
+    pages = corpus.pages(table_size)
+
+    def get_page(url, cache=False, stage="results"):
+        return Page(url, pages[url], parser=crawler.parser)
+
+    crawler.get_page = get_page
+    crawler.pages = pages
+    yield crawler
+    crawler.seen_ads.close()
+    shutil.rmtree(folder)
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """
+    Benchmarks `function`, and records the peak memory of a single call in the
+    benchmark's extra info. Fails when the peak is above `max_memory` KiB.
+    """
+
+    def run(function, max_memory=None):
+        tracemalloc.start()
+        try:
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_memory_kib"] = round(peak_memory, 1)
+
+        result = benchmark(function)
+        if max_memory is not None:
+            assert peak_memory <= max_memory, "{} used {:.0f} KiB, budget {} KiB".format(
+                request.node.name, peak_memory, max_memory
+            )
+        return result
+
+    return run
@@ -0,0 +1,160 @@
+"""
+Pages the benchmarks run against. They are synthetic: the hand written test fixtures,
+which only hold what the crawler reads, padded to the weight of a real wg-gesucht page
+with what it skips (see `full_weight`), plus results tables blown up to a large number
+of rows.
+"""
+
+import re
+
+from tests.stub_server import load_fixture
+
+BASE_URL = "https://www.wg-gesucht.de/"
+
+FILTERS_URL = BASE_URL + "mein-wg-gesucht-filter.html"
+TEMPLATES_URL = BASE_URL + "mein-wg-gesucht-message-templates.html"
+GALLERY_URL = BASE_URL + "wg-zimmer-in-Berlin.8.0.1.0.html"
+LIST_URL = BASE_URL + "wg-zimmer-in-Berlin.8.0.1.0.html?view=list"
+AD_URL = BASE_URL + "wg-zimmer-in-Berlin-Mitte.1000005.html"
+MESSENGER_URL = BASE_URL + "nachricht-senden.html?message_ad_id=1000005&ad_type=0"
+
+# a real results page has 20 rows, the large table is what a filter with a very
+# long results list would look like on a single page
+TABLE_SIZES = {"small": 20, "large": 1000}
+
+ROW = re.compile(r"\s*<tr class=\"listenansicht.*?</tr>", re.DOTALL)
+AD_ID = re.compile(r"\.1\d{6}\.html")
+
+
+def results_table(rows):
+    """The list view of the first results page, with `rows` rows."""
+    content = load_fixture("results_list_1.html").decode("utf-8")
+    row_templates = ROW.findall(content)
+    new_rows = [
+        AD_ID.sub(".{}.html".format(3000000 + index), row_templates[index % len(row_templates)])
+        for index in range(rows)
+    ]
+    start = content.index(row_templates[0])
+    end = content.index(row_templates[-1]) + len(row_templates[-1])
+    return (content[:start] + "".join(new_rows) + content[end:]).encode("utf-8")
+
+
+CITIES = [
+    "Berlin",
+    "Hamburg",
+    "Muenchen",
+    "Koeln",
+    "Frankfurt-am-Main",
+    "Stuttgart",
+    "Duesseldorf",
+    "Leipzig",
+    "Dresden",
+    "Hannover",
+    "Nuernberg",
+    "Bremen",
+]
+CATEGORIES = ["wg-zimmer", "1-zimmer-wohnungen", "wohnungen", "haeuser"]
+
+
+def head_padding():
+    """Stylesheets, meta tags, tracking setup and structured data of a real <head>."""
+    parts = [
+        '<link rel="stylesheet" href="/css/bundle.{0}.min.css?v=7.{0}">\n'.format(index)
+        for index in range(12)
+    ]
+    parts += [
+        '<meta property="og:tag{0}" content="WG-Gesucht.de - WG-Zimmer, Wohnungen '
+        'und Haeuser in {1}">\n'.format(index, CITIES[index % len(CITIES)])
+        for index in range(20)
+    ]
+    parts.append(
+        '<script type="application/ld+json">{"@context": "https://schema.org", '
+        '"@type": "WebSite", "url": "https://www.wg-gesucht.de/", "potentialAction": '
+        '{"@type": "SearchAction", "target": "https://www.wg-gesucht.de/suche?q={q}", '
+        '"query-input": "required name=q"}}</script>\n'
+    )
+    parts.append(
+        "<script>window.dataLayer = window.dataLayer || [];"
+        + "".join(
+            "dataLayer.push({{'event': 'config_{0}', 'value': {0}, 'city': '{1}'}});".format(
+                index, CITIES[index % len(CITIES)]
+            )
+            for index in range(150)
+        )
+        + "</script>\n"
+    )
+    return "".join(parts)
+
+
+def navigation():
+    """The site header: a menu linking every category in every large city."""
+    links = "".join(
+        '<li class="nav-item"><a class="nav-link" href="/{0}-in-{1}.8.{2}.1.0.html">'
+        "{0} in {1}</a></li>".format(category, city, number)
+        for number, city in enumerate(CITIES)
+        for category in CATEGORIES
+    )
+    return (
+        '<div id="cookie_banner" class="cookie-banner"><p>Wir verwenden Cookies, um '
+        "Inhalte und Anzeigen zu personalisieren und die Zugriffe auf unsere Website zu "
+        'analysieren.</p><button class="btn btn-primary">Akzeptieren</button></div>\n'
+        '<nav class="navbar navbar-default"><div class="navbar-header">'
+        '<a class="navbar-brand" href="/"><img src="/img/logo.svg" alt="WG-Gesucht"></a>'
+        '</div><ul class="nav navbar-nav">{}</ul></nav>\n'.format(links)
+    )
+
+
+def sidebar_and_footer():
+    """Similar ads, the footer links and the scripts loaded at the end of <body>."""
+    cards = "".join(
+        '<div class="card card-similar"><a href="/wg-zimmer-in-{0}-Zentrum.{1}.html">'
+        '<img src="/media/up/2026/10/{1}_thumb.jpg" alt="Zimmer in {0}" loading="lazy">'
+        '</a><div class="card-body"><span class="card-price">{2}&euro;</span>'
+        '<span class="card-size">{3}m&sup2;</span><span class="card-city">{0}</span>'
+        "</div></div>\n".format(
+            CITIES[index % len(CITIES)], 4000000 + index, 350 + index * 7, 10 + index % 15
+        )
+        for index in range(30)
+    )
+    footer_links = "".join(
+        '<li><a href="/{0}-in-{1}.html">{0} {1}</a></li>'.format(category, city)
+        for city in CITIES
+        for category in CATEGORIES + ["studenten", "zwischenmiete"]
+    )
+    scripts = "".join(
+        "<script>(function(e,t){{var n=t.querySelectorAll('.js-toggle-{0}');"
+        "for(var r=0;r<n.length;r++){{n[r].addEventListener('click',function(){{"
+        "e.track('toggle_{0}',{{'page':t.location.pathname}})}})}}"
+        "return n.length>{0}&&e.ready()}})(window.wgg,document);</script>\n".format(index)
+        for index in range(450)
+    )
+    return (
+        '<aside class="sidebar"><h4>Aehnliche Anzeigen</h4>{}</aside>\n'
+        '<footer class="footer"><ul class="footer-links">{}</ul></footer>\n'
+        '<script src="/js/vendor.min.js"></script>\n{}'.format(cards, footer_links, scripts)
+    )
+
+
+def full_weight(content):
+    """
+    Pads a fixture page with what a real page around it holds and the crawler never
+    reads: tracking scripts, a navigation menu, similar ads and the footer. None of it
+    matches anything the parsers look for.
+    """
+    content = content.decode("utf-8")
+    content = content.replace("</head>", head_padding() + "</head>", 1)
+    content = content.replace("<body>", "<body>\n" + navigation(), 1)
+    content = content.replace("</body>", sidebar_and_footer() + "</body>", 1)
+    return content.encode("utf-8")
+
+
+def pages(table_size="small"):
+    """URL -> page content for every page the benchmarked crawler methods ask for."""
+    return {
+        FILTERS_URL: full_weight(load_fixture("filters.html")),
+        TEMPLATES_URL: full_weight(load_fixture("templates.html")),
+        GALLERY_URL: full_weight(load_fixture("results_gallery.html")),
+        LIST_URL: full_weight(results_table(TABLE_SIZES[table_size])),
+        AD_URL: full_weight(load_fixture("ad.html")),
+        MESSENGER_URL: full_weight(load_fixture("messenger.html")),
+    }
@@ -0,0 +1,157 @@
+"""
+End to end throughput of the crawler against the local stub server in
+`tests.stub_server`: sign in, search every filter, message every new ad.
+
+Each run is a fresh crawler, so its first search finds and messages every ad
+("cold" cycle), followed by a second search which finds nothing new ("warm" cycle).
+The rate limiter is set high enough that it never sleeps, and a reCAPTCHA slows it
+down without pausing, so the times are the crawler's own plus whatever `--latency`
+the stub adds to each response.
+
+    python -m benchmarks.throughput --runs 5 --latency 0.02 --error-rate 0.05
+"""
+
+import time
+import shutil
+import logging
+import tempfile
+
+import click
+
+from wg_gesucht.parsers import PARSERS
+from wg_gesucht.rate_limiter import TokenBucket
+from wg_gesucht.transport import RequestFailed
+from tests.stub_server import StubServer, make_crawler
+
+
+def close_logger(crawler):
+    # every crawler adds its handlers to the same module logger
+    for handler in list(crawler.logger.handlers):
+        crawler.logger.removeHandler(handler)
+        handler.close()
+
+
+def timed_cycle(stub, crawler, sign_in=False):
+    requests_before, messages_before = len(stub.requests), len(stub.messages)
+    started = time.perf_counter()
+    if sign_in:
+        crawler.sign_in()
+    crawler.run_cycle()
+    return {
+        "duration": time.perf_counter() - started,
+        "requests": len(stub.requests) - requests_before,
+        "messages": len(stub.messages) - messages_before,
+    }
+
+
+def run_crawler(stub, folder, **kwargs):
+    """Returns the cold and warm cycle of one fresh crawler, or None if it had to stop."""
+    crawler = make_crawler(
+        folder,
+        stub=stub,
+        rate_limiter=TokenBucket(rate=1000000, burst=1000000, jitter=0),
+        captcha_pause=0,
+        **kwargs
+    )
+    try:
+        return timed_cycle(stub, crawler, sign_in=True), timed_cycle(stub, crawler)
+    except (SystemExit, RequestFailed):
+        return None
+    finally:
+        close_logger(crawler)
+        crawler.seen_ads.close()
+
+
+def report(name, cycles):
+    durations = [cycle["duration"] for cycle in cycles]
+    requests_made = sum(cycle["requests"] for cycle in cycles)
+    messages = sum(cycle["messages"] for cycle in cycles)
+    click.echo(
+        "{:<5} cycle time mean {:7.1f}ms  min {:7.1f}ms  max {:7.1f}ms  "
+        "{:5.1f} requests/cycle  {:6.1f} messages/s".format(
+            name,
+            sum(durations) / len(durations) * 1000,
+            min(durations) * 1000,
+            max(durations) * 1000,
+            requests_made / float(len(cycles)),
+            messages / sum(durations),
+        )
+    )
+
+
+@click.command()
+@click.option("--runs", default=5, show_default=True, help="Number of fresh crawlers to run")
+@click.option(
+    "--latency", default=0.0, show_default=True, help="Seconds added to every stub response"
+)
+@click.option(
+    "--error-rate",
+    default=0.0,
+    show_default=True,
+    help="Share of page requests the stub answers with a 503",
+)
+@click.option(
+    "--captcha-after",
+    type=int,
+    default=None,
+    help="Serve the reCAPTCHA page after this many requests",
+)
+@click.option(
+    "--captcha-count",
+    type=int,
+    default=None,
+    help="Number of reCAPTCHA pages served after --captcha-after (default all of them)",
+)
+@click.option(
+    "--parser", type=click.Choice(list(PARSERS)), default="html.parser", show_default=True
+)
+@click.option("--message-concurrency", default=1, show_default=True)
+@click.option("--async-fetch", is_flag=True)
+def main(
+    runs,
+    latency,
+    error_rate,
+    captcha_after,
+    captcha_count,
+    parser,
+    message_concurrency,
+    async_fetch,
+):
+    logging.getLogger("wg_gesucht").setLevel(logging.CRITICAL)
+    cold, warm = list(), list()
+    with StubServer(
+        latency=latency,
+        error_rate=error_rate,
+        captcha_after=captcha_after,
+        captcha_count=captcha_count,
+    ) as stub:
+        for _ in range(runs):
+            folder = tempfile.mkdtemp()
+            try:
+                cycles = run_crawler(
+                    stub,
+                    folder,
+                    parser=parser,
+                    message_concurrency=message_concurrency,
+                    async_fetch=async_fetch,
+                )
+            finally:
+                shutil.rmtree(folder)
+            if cycles is None:
+                click.echo(
+                    "Crawler stopped after {} requests (connection error)".format(
+                        len(stub.requests)
+                    )
+                )
+                break
+            cold.append(cycles[0])
+            warm.append(cycles[1])
+
+    if cold:
+        report("cold", cold)
+        report("warm", warm)
+    click.echo("{} requests, {} answered with an error".format(len(stub.requests), stub.errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,13 @@ requirements = [
     'urllib3==1.23',
 ]
 
+extras_requirements = {
+    'async': ['aiohttp'],
+    'lxml': ['lxml'],
+    'selectolax': ['selectolax'],
+    'benchmark': ['pytest', 'pytest-benchmark'],
+}
+
 test_requirements = []
 
 setup(
@@ -45,6 +52,7 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT",
     classifiers=[
         'Development Status :: 5 - Production/Stable',
@@ -0,0 +1,236 @@
+"""
+Local stand-in for wg-gesucht.de which serves the synthetic pages in `tests/fixtures`,
+hand written to hold only what the crawler reads.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import datetime
+import threading
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(__file__), "fixtures")
+
+FILTER_1 = "wg-zimmer-in-Berlin.8.0.1.0.html"
+FILTER_2 = "1-zimmer-wohnungen-in-Berlin.8.1.1.0.html"
+
+ROUTES = {
+    "/mein-wg-gesucht-filter.html": "filters.html",
+    "/mein-wg-gesucht-message-templates.html": "templates.html",
+    "/wg-zimmer-in-Berlin.8.0.1.0.html": "results_gallery.html",
+    "/wg-zimmer-in-Berlin.8.0.1.0.html?view=list": "results_list_1.html",
+    "/wg-zimmer-in-Berlin.8.0.1.1.html": "results_list_2.html",
+    "/1-zimmer-wohnungen-in-Berlin.8.1.1.0.html": "results_filter_2.html",
+}
+
+
+AD_PATH = re.compile(r"^/[\w-]+\.(\d+)\.html$")
+MESSENGER_PATH = re.compile(r"^/nachricht-senden\.html\?message_ad_id=(\d+)")
+
+
+def load_fixture(name, base_url="https://www.wg-gesucht.de/", ad_id="1000005"):
+    """
+    Returns the bytes of a fixture page, with the post date placeholders filled in
+    relative to today so the ads are always fresh enough to be picked up.
+    """
+    today = datetime.date.today()
+    replacements = {
+        "@TODAY@": today,
+        "@YESTERDAY@": today - datetime.timedelta(days=1),
+        "@OLD@": today - datetime.timedelta(days=10),
+    }
+    with open(os.path.join(FIXTURES_FOLDER, name), encoding="utf-8") as file:
+        content = file.read()
+    for placeholder, date in replacements.items():
+        content = content.replace(placeholder, date.strftime("%d.%m.%Y"))
+    content = content.replace("https://www.wg-gesucht.de/", base_url)
+    content = content.replace("@AD_ID@", ad_id)
+    return content.encode("utf-8")
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubServer:
+    """
+    Serves the fixture pages on a local port, and accepts the login and message POSTs.
+
+    `latency` seconds are added to every response. A share `error_rate` of the GET
+    requests is answered with a 503 (chosen by a random generator seeded with `seed`,
+    so runs are repeatable), and after the first `captcha_after` GETs the next
+    `captcha_count` ones (all of them if None) get the reCAPTCHA page.
+
+    With `require_login` the account pages, the messenger form and the message POST
+    need the session cookie handed out by the login POST, like on wg-gesucht.de the
+    pages redirect to the login page without it. `expire_sessions` signs everyone out.
+    """
+
+    def __init__(
+        self,
+        routes=None,
+        latency=0.0,
+        error_rate=0.0,
+        captcha_after=None,
+        captcha_count=None,
+        seed=0,
+        require_login=False,
+    ):
+        self.routes = routes or ROUTES
+        self.require_login = require_login
+        self.sessions = set()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.captcha_after = captcha_after
+        self.captcha_count = captcha_count
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = list()
+        self.messages = list()
+        self.errors = 0
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.base_url = "http://127.0.0.1:{}/".format(self._server.server_address[1])
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def expire_sessions(self):
+        self.sessions.clear()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in separate writes, Nagle would hold the body
+            # back until the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                time.sleep(stub.latency)
+                with stub._lock:
+                    fail = stub.error_rate and stub._random.random() < stub.error_rate
+                    if fail:
+                        stub.errors += 1
+                if fail:
+                    self.send_error(503)
+                    return
+                if stub.captcha_after is not None and len(stub.requests) > stub.captcha_after:
+                    if stub.captcha_count is None or stub.captcha_count > 0:
+                        if stub.captcha_count is not None:
+                            stub.captcha_count -= 1
+                        self.respond(load_fixture("captcha.html", stub.base_url))
+                        return
+
+                if self.path == "/login.html":
+                    self.respond(b"<html><body>Login</body></html>")
+                    return
+                if self.path.startswith("/mein-wg-gesucht") or MESSENGER_PATH.match(
+                    self.path
+                ):
+                    if not self.signed_in():
+                        self.send_response(302)
+                        self.send_header("Location", stub.base_url + "login.html")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+
+                ad_id = "1000005"
+                fixture = stub.routes.get(self.path)
+                if fixture is None and AD_PATH.match(self.path):
+                    fixture, ad_id = "ad.html", AD_PATH.match(self.path).group(1)
+                if fixture is None and MESSENGER_PATH.match(self.path):
+                    fixture = "messenger.html"
+                    ad_id = MESSENGER_PATH.match(self.path).group(1)
+                if fixture is None:
+                    self.send_error(404)
+                    return
+                content = load_fixture(fixture, stub.base_url, ad_id)
+                etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.respond(content, headers={"ETag": etag})
+
+            def do_POST(self):
+                stub.requests.append(self.path)
+                time.sleep(stub.latency)
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.endswith("action=login"):
+                    token = "session-{}".format(len(stub.requests))
+                    stub.sessions.add(token)
+                    self.respond(
+                        b"true",
+                        "application/json",
+                        headers={"Set-Cookie": "wgg_session={}; Path=/".format(token)},
+                    )
+                elif self.path.endswith("action=conversations") and not self.signed_in():
+                    self.send_error(401)
+                elif self.path.endswith("action=conversations"):
+                    stub.messages.append(json.loads(body.decode("utf-8")))
+                    response = {"conversation_id": str(len(stub.messages))}
+                    self.respond(json.dumps(response).encode("utf-8"), "application/json")
+                else:
+                    self.send_error(404)
+
+            def signed_in(self):
+                if not stub.require_login:
+                    return True
+                cookie = SimpleCookie(self.headers.get("Cookie", ""))
+                return "wgg_session" in cookie and cookie["wgg_session"].value in stub.sessions
+
+            def respond(
+                self, content, content_type="text/html; charset=utf-8", headers=None
+            ):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                for name, value in (headers or dict()).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def make_crawler(folder, stub=None, **kwargs):
+    """
+    Returns a crawler which keeps its files in `folder`. Given a `stub` it talks to
+    that server, with a rate limiter that never makes the tests wait.
+    """
+    from wg_gesucht.crawler import WgGesuchtCrawler
+    from wg_gesucht.rate_limiter import TokenBucket
+
+    if stub is not None:
+        kwargs.setdefault("base_url", stub.base_url)
+        kwargs.setdefault("rate_limiter", TokenBucket(rate=1000, jitter=0))
+    for name in ("ad_links", "offline_ads", "logs"):
+        os.makedirs(os.path.join(folder, name), exist_ok=True)
+    return WgGesuchtCrawler(
+        {"email": "test@example.com", "password": "secret"},
+        os.path.join(folder, "ad_links"),
+        os.path.join(folder, "offline_ads"),
+        os.path.join(folder, "logs"),
+        None,
+        None,
+        False,
+        **kwargs
+    )
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_async_crawler
+----------------------------------
+
+Tests for `wg_gesucht.async_crawler` module.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+from wg_gesucht.transport import RequestFailed
+from tests.stub_server import StubServer, make_crawler, FILTER_1, FILTER_2
+
+try:
+    # async def is a syntax error before Python 3.5
+    from wg_gesucht import async_crawler
+except (SyntaxError, ImportError):  # pragma: no cover
+    async_crawler = None
+
+
+@unittest.skipIf(
+    async_crawler is None or async_crawler.aiohttp is None,
+    "needs Python 3.5 and aiohttp",
+)
+class TestAsyncFetchEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def test_same_ads_as_sequential_fetch(self):
+        with StubServer() as stub:
+            crawler = make_crawler(self.folder, stub=stub)
+            filters = [stub.base_url + FILTER_1, stub.base_url + FILTER_2]
+
+            expected = crawler.fetch_ads(filters)
+            ads = async_crawler.AsyncFetchEngine(crawler).fetch_ads(filters)
+
+        self.assertEqual([ad.url for ad in ads], [ad.url for ad in expected])
+        self.assertEqual(
+            {ad.url for ad in ads},
+            {
+                stub.base_url + "wg-zimmer-in-Berlin-Mitte.1000005.html",
+                stub.base_url + "wg-zimmer-in-Berlin-Wedding.1000004.html",
+                stub.base_url + "wg-zimmer-in-Berlin-Neukoelln.1000003.html",
+                stub.base_url + "wg-zimmer-in-Berlin-Pankow.1000002.html",
+                stub.base_url
+                + "1-zimmer-wohnungen-in-Berlin-Friedrichshain.2000001.html",
+            },
+        )
+
+    def test_server_errors_raise(self):
+        with StubServer(error_rate=1.0) as stub:
+            crawler = make_crawler(self.folder, stub=stub)
+            with self.assertRaises(RequestFailed):
+                async_crawler.AsyncFetchEngine(crawler).fetch_ads([stub.base_url + FILTER_1])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
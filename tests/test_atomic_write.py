@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_atomic_write
+----------------------------------
+
+Tests for `wg_gesucht.atomic_write` module.
+"""
+
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+from wg_gesucht.atomic_write import write_atomically
+
+
+class TestWriteAtomically(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "state.json")
+
+    def test_replaces_file(self):
+        write_atomically(self.path, b"first")
+        write_atomically(self.path, b"second", permissions=0o600)
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read(), b"second")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(os.listdir(self.folder), ["state.json"])
+
+    def test_failed_write_leaves_old_file(self):
+        write_atomically(self.path, b"first")
+        with self.assertRaises(TypeError):
+            write_atomically(self.path, "not bytes")
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read(), b"first")
+        self.assertEqual(os.listdir(self.folder), ["state.json"])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
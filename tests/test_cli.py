@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cli
+----------------------------------
+
+Tests for the option handling of `wg_gesucht.cli`.
+"""
+
+import unittest
+
+from click.testing import CliRunner
+
+from wg_gesucht import cli
+
+
+class TestFilterWeights(unittest.TestCase):
+    def test_weights_are_read_per_filter(self):
+        weights = cli.parse_filter_weights(None, None, "Berlin WG=1, Hamburg WG = -2,")
+        self.assertEqual(weights, {"berlin wg": 1, "hamburg wg": -2})
+
+    def test_no_weights(self):
+        self.assertEqual(cli.parse_filter_weights(None, None, ""), {})
+
+    def test_bad_weights_are_rejected_before_starting(self):
+        runner = CliRunner()
+        for value in ["Berlin=1.5", "x=abc", "Berlin"]:
+            with self.subTest(value=value):
+                result = runner.invoke(cli.cli, ["--filter-weights", value])
+                self.assertEqual(result.exit_code, 2)
+                self.assertIn("--filter-weights", result.output)
+                self.assertNotIn("Traceback", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_crawler
+----------------------------------
+
+Tests for `wg_gesucht.crawler` module, run against the local stub server.
+"""
+
+import os
+import json
+import shutil
+import signal
+import tempfile
+import unittest
+
+from wg_gesucht.ads import AdRecord, ad_id_from_url, ad_key
+from wg_gesucht.http_cache import ResponseCache
+from tests.stub_server import StubServer, make_crawler, FILTER_1
+
+
+class TestWgGesuchtCrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def test_email_apartment(self):
+        with StubServer() as stub:
+            crawler = make_crawler(self.folder, stub=stub)
+            ad_url = stub.base_url + "wg-zimmer-in-Berlin-Mitte.1000005.html"
+            crawler.email_apartment(ad_url, "Hallo!")
+            crawler.flush_files()
+
+        self.assertEqual(
+            stub.messages,
+            [
+                {
+                    "user_id": "4242",
+                    "ad_type": "0",
+                    "ad_id": "1000005",
+                    "csrf_token": "c2VjcmV0LXRva2Vu",
+                    "messages": [{"content": "Hallo!", "message_type": "text"}],
+                }
+            ],
+        )
+        self.assertTrue(crawler.already_sent(ad_url))
+        offline_ads = os.listdir(crawler.offline_ad_folder)
+        self.assertEqual(len(offline_ads), 1)
+        self.assertTrue(offline_ads[0].startswith("Maria Muster-Helles Zimmer in Mitte"))
+        # straight to the messenger form, the ad page only after the message is sent
+        self.assertEqual(
+            stub.requests,
+            [
+                "/nachricht-senden.html?message_ad_id=1000005&ad_type=0",
+                "/ajax/api/Smp/api.php?action=conversations",
+                "/wg-zimmer-in-Berlin-Mitte.1000005.html",
+            ],
+        )
+
+    def test_email_apartment_without_offline_copy(self):
+        with StubServer() as stub:
+            crawler = make_crawler(
+                self.folder,
+                stub=stub,
+                offline_copies=False,
+            )
+            crawler.email_apartment(
+                stub.base_url + "wg-zimmer-in-Berlin-Mitte.1000005.html", "Hallo!"
+            )
+            # no ad type in the URL, so the contact button on the ad page is used
+            crawler.email_apartment(stub.base_url + "Zimmer-in-Mitte.1000004.html", "Hallo!")
+            crawler.flush_files()
+
+        self.assertEqual([message["ad_id"] for message in stub.messages], ["1000005", "1000004"])
+        self.assertEqual(len(stub.requests), 5)
+        self.assertEqual(stub.requests[2], "/Zimmer-in-Mitte.1000004.html")
+        self.assertEqual(len(os.listdir(crawler.offline_ad_folder)), 1)
+
+    def test_captcha_pauses_and_slows_down(self):
+        pauses = list()
+        with StubServer(captcha_after=1, captcha_count=2) as stub:
+            crawler = make_crawler(
+                self.folder,
+                stub=stub,
+                captcha_pause=60,
+            )
+            crawler.throttle.sleep = pauses.append
+            self.assertTrue(crawler.get_page(stub.base_url + FILTER_1))
+            page = crawler.get_page(stub.base_url + FILTER_1)
+
+        self.assertFalse(page.has_captcha())
+        self.assertEqual(len(stub.requests), 4)
+        # two captchas in a row: the second pause is twice as long, the rate is a quarter
+        self.assertEqual([round(pause) for pause in pauses], [60, 120])
+        self.assertEqual(crawler.throttle.rate, 250)
+
+        # the learned rate is picked up by the next crawler
+        restarted = make_crawler(self.folder, stub=stub)
+        self.assertEqual(restarted.throttle.rate, 250)
+
+    def test_watermark_stops_paging(self):
+        with StubServer() as stub:
+            crawler = make_crawler(self.folder, stub=stub)
+            filter_url = stub.base_url + FILTER_1
+
+            ads = crawler.fetch_ads([filter_url])
+            self.assertEqual(len(ads), 4)
+            self.assertEqual(len(stub.requests), 3)
+            self.assertIsNone(crawler.seen_ads.watermark(filter_url))
+
+            # stopped before messaging the ad on the second page
+            unsent = stub.base_url + "wg-zimmer-in-Berlin-Pankow.1000002.html"
+            crawler.email_apartments([ad for ad in ads if ad.url != unsent], "Hallo!")
+            self.assertEqual(crawler.seen_ads.watermark(filter_url)[0], 999000)
+
+            # straight to the list view, and on to the second page for the unsent ad
+            requests_made = len(stub.requests)
+            ads = crawler.fetch_ads([filter_url])
+            self.assertEqual([ad.url for ad in ads], [unsent])
+            self.assertEqual(len(stub.requests), requests_made + 2)
+
+            crawler.email_apartments(ads, "Hallo!")
+            self.assertEqual(crawler.seen_ads.watermark(filter_url)[0], 1000005)
+
+            # everything messaged: the first page only
+            requests_made = len(stub.requests)
+            self.assertEqual(crawler.fetch_ads([filter_url]), [])
+            self.assertEqual(len(stub.requests), requests_made + 1)
+
+    def test_poll_only_returns_new_ads(self):
+        with StubServer() as stub:
+            crawler = make_crawler(
+                self.folder,
+                stub=stub,
+                poll_interval=30,
+            )
+            filter_url = stub.base_url + FILTER_1
+            crawler.fetch_ads([filter_url])
+            requests_made = len(stub.requests)
+
+            # nothing changed: one request for the first page, nothing to message
+            self.assertEqual(crawler.poll_ads([filter_url]), [])
+            self.assertEqual(len(stub.requests), requests_made + 1)
+
+            # drop one row from the snapshot, as if it had just been posted
+            new_href = "wg-zimmer-in-Berlin-Mitte.1000005.html"
+            crawler.poll_snapshots[filter_url] = frozenset(
+                key for key in crawler.poll_snapshots[filter_url] if key != ad_key(new_href)
+            )
+            ads = crawler.poll_ads([filter_url])
+            self.assertEqual([ad.url for ad in ads], [stub.base_url + new_href])
+            self.assertEqual(len(stub.requests), requests_made + 2)
+
+    def test_account_settings_cached_across_cycles(self):
+        with StubServer() as stub:
+            crawler = make_crawler(
+                self.folder,
+                stub=stub,
+                settings_refresh_cycles=2,
+            )
+            template_text, filters = crawler.get_account_settings()
+            self.assertTrue(template_text.startswith("Hallo,"))
+            self.assertEqual(len(filters), 3)
+
+            crawler.counter += 1
+            crawler.get_account_settings()
+            self.assertEqual(len(stub.requests), 2)
+
+            crawler.counter += 1
+            crawler.get_account_settings()
+            self.assertEqual(len(stub.requests), 4)
+
+            crawler.refresh_account_settings()
+            crawler.get_account_settings()
+            self.assertEqual(len(stub.requests), 6)
+
+    def test_cached_page_expiring_during_request(self):
+        with StubServer() as stub:
+            crawler = make_crawler(self.folder, stub=stub)
+            clock = [0.0]
+            crawler.response_cache = ResponseCache(ttl=60, clock=lambda: clock[0])
+            filter_url = stub.base_url + FILTER_1
+            crawler.get_page(filter_url, cache=True)
+
+            # the cached copy expires between reading its ETag and the 304 coming back
+            acquire = crawler.rate_limiter.acquire
+
+            def acquire_slowly():
+                clock[0] += 61
+                return acquire()
+
+            crawler.rate_limiter.acquire = acquire_slowly
+            page = crawler.get_page(filter_url, cache=True)
+
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(page.status_code, 200)
+        self.assertIsNotNone(crawler.find_list_view_href(page.results_tree))
+        self.assertIsNotNone(page.cache_entry)
+
+    def test_connection_loss_gives_up_the_search(self):
+        with StubServer() as stub:
+            pass
+        # the stub is gone, every request is refused
+        crawler = make_crawler(self.folder, stub=stub, retries=0)
+        with self.assertLogs("wg_gesucht.crawler", "WARNING") as logs:
+            crawler.run_cycle()
+        self.assertIn("Gave up on this search", logs.output[-1])
+        self.assertIsNone(crawler.account_settings)
+        self.assertEqual(crawler.counter, 2)
+
+    def test_server_errors_give_up_the_search(self):
+        with StubServer(error_rate=1.0) as stub:
+            crawler = make_crawler(
+                self.folder,
+                stub=stub,
+                retries=0,
+            )
+            with self.assertLogs("wg_gesucht.crawler", "WARNING") as logs:
+                crawler.run_cycle()
+        self.assertIn("Gave up on this search", logs.output[-1])
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(crawler.throttle.clean, 0)
+
+    def test_freshest_ads_messaged_first(self):
+        with StubServer() as stub:
+            crawler = make_crawler(
+                self.folder,
+                stub=stub,
+                filter_weights={"berlin 1-zimmer": -1},
+            )
+            template_text, filters = crawler.get_account_settings()
+            ads = crawler.fetch_ads(filters)
+            crawler.email_apartments(ads, template_text)
+
+        # 2000001 was posted today, but its filter is weighted down by a day, which
+        # puts it with yesterday's ads, ahead of those further down their results
+        expected = ["1000005", "1000004", "2000001", "1000003", "1000002"]
+        self.assertEqual([str(ad.ad_id) for ad in ads], expected)
+        self.assertEqual([message["ad_id"] for message in stub.messages], expected)
+        self.assertGreaterEqual(crawler.time_to_freshest_message, 0)
+
+    def test_request_timings_exported(self):
+        with StubServer() as stub:
+            crawler = make_crawler(
+                self.folder,
+                stub=stub,
+                export_timings=True,
+            )
+            crawler.sign_in()
+            crawler.run_cycle()
+
+        with open(os.path.join(crawler.logs_folder, "request_timings.jsonl")) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), len(stub.requests))
+        self.assertEqual(
+            {record["stage"] for record in records},
+            {"login", "template", "filters", "results", "ad", "form", "send"},
+        )
+        self.assertTrue(all(record["network"] > 0 for record in records))
+
+        with open(os.path.join(crawler.logs_folder, "wg_gesucht.prom")) as file:
+            prometheus_text = file.read()
+        self.assertIn('wg_gesucht_requests_total{stage="send"} 5', prometheus_text)
+
+    def test_files_written_when_stopped(self):
+        crawler = make_crawler(self.folder)
+        ad = AdRecord("https://www.wg-gesucht.de/wg-zimmer-in-Berlin-Mitte.1000005.html")
+        ad.title, ad.submitter, ad.content = "Zimmer", "Maria", b"<html></html>"
+        crawler.update_files(ad)
+        self.assertTrue(crawler.already_sent(ad.url))
+        self.assertEqual(os.listdir(crawler.offline_ad_folder), [])
+
+        # as after a SIGTERM: the scheduler stops, search() returns
+        handlers = [signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGHUP)]
+        try:
+            crawler.scheduler.stop()
+            crawler.search()
+        finally:
+            signal.signal(signal.SIGTERM, handlers[0])
+            signal.signal(signal.SIGHUP, handlers[1])
+
+        self.assertEqual(len(os.listdir(crawler.offline_ad_folder)), 1)
+        with open(crawler.seen_ads.csv_export_path) as file:
+            self.assertIn(ad.url, file.read())
+
+    def test_ad_record(self):
+        ad = AdRecord("https://www.wg-gesucht.de/wg-zimmer-in-Berlin-Mitte.1000005.html")
+        self.assertEqual(ad.ad_id, 1000005)
+        self.assertEqual(ad.ad_type, 0)
+        # the same ad under another slug, host or with a tracking query
+        self.assertEqual(ad.key, "0:1000005")
+        self.assertEqual(ad_key("wg-zimmer-in-Berlin-Wedding.1000005.html?utm_source=x"), ad.key)
+        self.assertEqual(ad_key("https://www.wg-gesucht.de/"), "https://www.wg-gesucht.de/")
+        self.assertEqual(ad_id_from_url("https://www.wg-gesucht.de/"), None)
+        with self.assertRaises(AttributeError):
+            ad.ad_page_soup = None
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_http_cache
+----------------------------------
+
+Tests for `wg_gesucht.http_cache` module.
+"""
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from wg_gesucht.http_cache import ResponseCache
+from tests.stub_server import StubServer, make_crawler
+
+
+class FakeResponse:
+    def __init__(self, content, headers=None):
+        self.content = content
+        self.headers = headers or dict()
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_validators_ttl_and_eviction(self):
+        clock = mock.Mock(return_value=0)
+        cache = ResponseCache(max_entries=2, ttl=10, clock=clock)
+        cache.store("a", FakeResponse(b"a", {"ETag": '"1"'}))
+        cache.store("b", FakeResponse(b"b", {"Last-Modified": "yesterday"}))
+        self.assertEqual(cache.validators("a"), {"If-None-Match": '"1"'})
+        self.assertEqual(cache.validators("b"), {"If-Modified-Since": "yesterday"})
+
+        cache.store("c", FakeResponse(b"c"))
+        self.assertIsNone(cache.get("a"))
+        clock.return_value = 11
+        self.assertIsNone(cache.get("b"))
+
+    def test_unchanged_body_keeps_parsed_values(self):
+        cache = ResponseCache()
+        page = mock.Mock(cache_entry=cache.store("a", FakeResponse(b"same")))
+        self.assertEqual(cache.parsed(page, "n", lambda page: 1), 1)
+        page.cache_entry = cache.store("a", FakeResponse(b"same"))
+        self.assertEqual(cache.parsed(page, "n", lambda page: 2), 1)
+        page.cache_entry = cache.store("a", FakeResponse(b"changed"))
+        self.assertEqual(cache.parsed(page, "n", lambda page: 3), 3)
+
+
+class TestCrawlerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def test_not_modified_pages_are_not_parsed_again(self):
+        with StubServer() as stub:
+            crawler = make_crawler(self.folder, stub=stub)
+            with mock.patch.object(
+                crawler.parser, "filter_links", wraps=crawler.parser.filter_links
+            ) as filter_links:
+                first = crawler.fetch_filters()
+                second = crawler.fetch_filters()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(filter_links.call_count, 1)
+        self.assertEqual(crawler.response_cache.hits, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_offline_archive
+----------------------------------
+
+Tests for `wg_gesucht.offline_archive` module.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from wg_gesucht.offline_archive import OfflineArchive
+
+
+class TestOfflineArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.archive_folder = os.path.join(self.folder, "Offline Ad Links")
+
+    def test_pages_kept_when_disk_fails(self):
+        archive = OfflineArchive(self.archive_folder)
+        archive.add("Anna-Zimmer-a", b"<html>a</html>")
+        archive.add("Ben-Zimmer-b", b"<html>b</html>")
+
+        # the folder is missing, nothing can be written
+        with self.assertLogs("wg_gesucht.offline_archive", "ERROR"):
+            self.assertEqual(archive.flush(), 0)
+        self.assertEqual(len(archive), 2)
+
+        os.mkdir(self.archive_folder)
+        self.assertEqual(archive.flush(), 2)
+        self.assertEqual(sorted(os.listdir(self.archive_folder)), ["Anna-Zimmer-a", "Ben-Zimmer-b"])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
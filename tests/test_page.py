@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_page
+----------------------------------
+
+Tests for `wg_gesucht.page` module.
+"""
+
+import unittest
+
+from wg_gesucht.page import Page
+
+
+class TestPage(unittest.TestCase):
+
+    def test_no_tree_built_without_captcha_marker(self):
+        page = Page("https://www.wg-gesucht.de/", b"<html><body><p>Hallo</p></body></html>")
+        self.assertFalse(page.has_captcha())
+        self.assertIsNone(page._tree)
+
+    def test_captcha_detected_and_tree_shared(self):
+        page = Page(
+            "https://www.wg-gesucht.de/",
+            b'<html><body><div class="g-recaptcha" data-sitekey="x"></div></body></html>',
+        )
+        self.assertTrue(page.has_captcha())
+        self.assertIs(page.tree, page.tree)
+
+    def test_marker_outside_captcha_div(self):
+        page = Page(
+            "https://www.wg-gesucht.de/",
+            b'<html><head><script src="g-recaptcha.js"></script></head></html>',
+        )
+        self.assertFalse(page.has_captcha())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_parsers
+----------------------------------
+
+Tests for `wg_gesucht.parsers` module, every backend has to extract exactly the same
+information from the synthetic fixture pages.
+"""
+
+import os
+import unittest
+
+from wg_gesucht.parsers import PARSERS, get_parser
+from tests.stub_server import FIXTURES_FOLDER, load_fixture
+
+EXTRACTORS = [
+    "has_captcha",
+    "page_title",
+    "template_texts",
+    "filter_links",
+    "list_view_href",
+    "search_results",
+    "contact_href",
+    "messenger_form",
+    "message_recipient",
+]
+
+
+def extract_all(parser, content):
+    tree = parser.parse(content)
+    results = dict()
+    for extractor in EXTRACTORS:
+        results[extractor] = getattr(parser, extractor)(tree)
+    return results
+
+
+def available_parsers():
+    parsers = list()
+    for name in PARSERS:
+        try:
+            parsers.append(get_parser(name))
+        except RuntimeError:
+            pass
+    return parsers
+
+
+class TestParsers(unittest.TestCase):
+
+    def setUp(self):
+        self.reference = get_parser("html.parser")
+        self.corpus = sorted(
+            name for name in os.listdir(FIXTURES_FOLDER) if name.endswith(".html")
+        )
+
+    def test_backends_agree_on_corpus(self):
+        for name in self.corpus:
+            content = load_fixture(name)
+            expected = extract_all(self.reference, content)
+            for parser in available_parsers():
+                with self.subTest(page=name, parser=parser.name):
+                    self.assertEqual(extract_all(parser, content), expected)
+
+    def test_reference_extraction(self):
+        parser = self.reference
+        results = extract_all(parser, load_fixture("results_list_1.html"))
+        rows, next_href = results["search_results"]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0][0], "wg-zimmer-in-Berlin-Mitte.1000005.html")
+        self.assertEqual(next_href, "wg-zimmer-in-Berlin.8.0.1.1.html")
+
+        gallery = parser.parse(load_fixture("results_gallery.html"))
+        self.assertEqual(
+            parser.list_view_href(gallery), "wg-zimmer-in-Berlin.8.0.1.0.html?view=list"
+        )
+
+        messenger = parser.parse(load_fixture("messenger.html"))
+        self.assertEqual(
+            parser.messenger_form(messenger),
+            {
+                "user_id": "4242",
+                "ad_type": "0",
+                "ad_id": "1000005",
+                "csrf_token": "c2VjcmV0LXRva2Vu",
+                "message_input": None,
+            },
+        )
+        self.assertTrue(parser.has_captcha(parser.parse(load_fixture("captcha.html"))))
+
+    def test_partial_results_tree(self):
+        for name in self.corpus:
+            if not name.startswith("results_"):
+                continue
+            content = load_fixture(name)
+            for parser in available_parsers():
+                with self.subTest(page=name, parser=parser.name):
+                    full_tree = parser.parse(content)
+                    results_tree = parser.parse_results(content)
+                    self.assertEqual(
+                        parser.search_results(results_tree),
+                        parser.search_results(full_tree),
+                    )
+                    self.assertEqual(
+                        parser.list_view_href(results_tree),
+                        parser.list_view_href(full_tree),
+                    )
+
+    def test_unknown_parser(self):
+        with self.assertRaises(ValueError):
+            get_parser("html5lib-but-misspelled")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_pipeline
+----------------------------------
+
+Tests for `wg_gesucht.pipeline` module, run against the local stub server.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from wg_gesucht.ads import AdRecord
+from wg_gesucht.pipeline import MessagePipeline
+from tests.stub_server import StubServer, make_crawler
+
+AD_PATHS = [
+    "wg-zimmer-in-Berlin-Mitte.1000005.html",
+    "wg-zimmer-in-Berlin-Wedding.1000004.html",
+    "wg-zimmer-in-Berlin-Neukoelln.1000003.html",
+    "wg-zimmer-in-Berlin-Pankow.1000002.html",
+    "1-zimmer-wohnungen-in-Berlin-Friedrichshain.2000001.html",
+]
+
+
+class TestMessagePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def send_all(self, name, concurrency):
+        with StubServer() as stub:
+            crawler = make_crawler(
+                os.path.join(self.folder, name),
+                stub=stub,
+                message_concurrency=concurrency,
+            )
+            ad_urls = [stub.base_url + path for path in AD_PATHS]
+            crawler.email_apartments(ad_urls, "Hallo!")
+        messages = sorted(stub.messages, key=lambda message: message["ad_id"])
+        return messages, sorted(os.listdir(crawler.offline_ad_folder)), crawler
+
+    def test_same_output_as_sequential_path(self):
+        sequential = self.send_all("sequential", 1)
+        pipelined = self.send_all("pipelined", 3)
+
+        self.assertEqual(len(pipelined[0]), len(AD_PATHS))
+        self.assertEqual(pipelined[0], sequential[0])
+        # offline copy names include the stub server's port, which differs between runs
+        self.assertEqual(len(pipelined[1]), len(sequential[1]))
+        self.assertEqual(len(pipelined[2].seen_ads), len(AD_PATHS))
+
+    def test_exit_is_raised_in_calling_thread(self):
+        crawler = make_crawler(self.folder)
+
+        def fetch_ad(ad):
+            raise SystemExit(1)
+
+        crawler.fetch_ad = fetch_ad
+        ads = [AdRecord(url) for url in ["a", "b", "c"]]
+        with self.assertRaises(SystemExit):
+            MessagePipeline(crawler, 2).run(ads, "Hallo!")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
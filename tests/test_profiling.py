@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_profiling
+----------------------------------
+
+Tests for `wg_gesucht.profiling` module, run against the local stub server.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from wg_gesucht.profiling import SleepRecorder, profile_cycle
+from wg_gesucht.rate_limiter import TokenBucket
+from tests.stub_server import StubServer, make_crawler
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def test_profile_cycle(self):
+        sleep_recorder = SleepRecorder()
+        with StubServer() as stub:
+            crawler = make_crawler(
+                self.folder,
+                stub=stub,
+                # slow enough that nearly every request would have to wait
+                rate_limiter=TokenBucket(rate=0.1, burst=1, jitter=0, sleep=sleep_recorder),
+            )
+            crawler.sign_in()
+            profile_path = profile_cycle(crawler, sleep_recorder)
+
+        self.assertEqual(sleep_recorder.calls, len(stub.requests) - 1)
+        self.assertGreater(sleep_recorder.total, 100)
+        self.assertEqual(len(stub.messages), 5)
+
+        base_path = profile_path[: -len(".prof")]
+        for extension in (".prof", ".txt", ".collapsed"):
+            self.assertTrue(os.path.isfile(base_path + extension))
+        with open(base_path + ".collapsed") as file:
+            stacks = file.read().splitlines()
+        self.assertTrue(stacks)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in stacks))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_rate_limiter
+----------------------------------
+
+Tests for `wg_gesucht.rate_limiter` module.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from wg_gesucht.rate_limiter import AdaptiveThrottle, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(
+            rate=0.2, burst=2, jitter=0, clock=self.clock, sleep=self.clock.sleep
+        )
+
+    def test_burst_then_rate(self):
+        self.assertEqual(self.bucket.acquire(), 0)
+        self.assertEqual(self.bucket.acquire(), 0)
+        self.assertAlmostEqual(self.bucket.acquire(), 5.0)
+        self.assertAlmostEqual(self.bucket.acquire(), 5.0)
+
+        stats = self.bucket.stats()
+        self.assertEqual(stats["requests"], 4)
+        self.assertEqual(stats["waits"], 2)
+        self.assertAlmostEqual(stats["total_wait"], 10.0)
+        self.assertAlmostEqual(self.bucket.current_rate, 0.3)
+
+    def test_idle_time_counts_towards_budget(self):
+        self.bucket.acquire()
+        self.bucket.acquire()
+        self.clock.sleep(3)
+        self.assertAlmostEqual(self.bucket.acquire(), 2.0)
+        self.clock.sleep(60)
+        self.assertEqual(self.bucket.acquire(), 0)
+        self.assertEqual(self.bucket.acquire(), 0)
+
+
+class TestAdaptiveThrottle(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(
+            rate=0.2, burst=2, jitter=0, clock=self.clock, sleep=self.clock.sleep
+        )
+        self.throttle = AdaptiveThrottle(
+            self.bucket, clean_requests=2, pause=60, max_pause=100, clock=self.clock
+        )
+
+    def test_slows_down_and_recovers(self):
+        self.throttle.congestion("reCAPTCHA", self.throttle.events)
+        self.assertAlmostEqual(self.throttle.rate, 0.1)
+        self.assertAlmostEqual(self.throttle.remaining(), 60)
+
+        # requests in flight with the first one don't slow it down again
+        self.throttle.congestion("reCAPTCHA", 0)
+        self.assertAlmostEqual(self.throttle.rate, 0.1)
+
+        self.clock.sleep(60)
+        self.throttle.congestion("reCAPTCHA", self.throttle.events)
+        self.assertAlmostEqual(self.throttle.rate, 0.05)
+        self.assertAlmostEqual(self.throttle.remaining(), 100)
+
+        self.throttle.success()
+        self.throttle.success()
+        self.assertAlmostEqual(self.throttle.rate, 0.055)
+        self.assertEqual(self.throttle.current_pause, 60)
+
+    def test_saved_rate_never_faster_than_configured(self):
+        state_file = os.path.join(tempfile.mkdtemp(), "throttle.json")
+        try:
+            AdaptiveThrottle(TokenBucket(rate=0.2), state_file=state_file).congestion(
+                "reCAPTCHA", 0
+            )
+            self.assertAlmostEqual(
+                AdaptiveThrottle(TokenBucket(rate=0.2), state_file=state_file).rate, 0.1
+            )
+            # slowed down since: the configured rate wins
+            self.assertAlmostEqual(
+                AdaptiveThrottle(TokenBucket(rate=0.05), state_file=state_file).rate, 0.05
+            )
+        finally:
+            shutil.rmtree(os.path.dirname(state_file))
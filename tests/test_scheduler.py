@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_scheduler
+----------------------------------
+
+Tests for `wg_gesucht.scheduler` module.
+"""
+
+import sys
+import unittest
+from unittest import mock
+
+from wg_gesucht.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_cycle_duration_is_subtracted_from_pause(self):
+        clock = mock.Mock(side_effect=[0.0, 100.0])
+        scheduler = Scheduler(lambda: None, interval=270, jitter=0, clock=clock)
+        with mock.patch.object(scheduler._stop, "wait") as wait:
+            wait.side_effect = lambda delay: scheduler.stop()
+            scheduler.run()
+
+        wait.assert_called_once_with(170.0)
+        self.assertEqual(scheduler.stats()["last_duration"], 100.0)
+
+    def test_many_cycles_without_recursion(self):
+        cycles = sys.getrecursionlimit() * 2
+        scheduler = Scheduler(lambda: None, interval=0, jitter=0)
+        scheduler.run(max_cycles=cycles)
+        self.assertEqual(scheduler.cycles, cycles)
+
+    def test_stop(self):
+        scheduler = Scheduler(lambda: scheduler.stop(), interval=0, jitter=0)
+        scheduler.run()
+        self.assertEqual(scheduler.cycles, 1)
+        self.assertTrue(scheduler.stopped)
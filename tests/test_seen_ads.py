@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_seen_ads
+----------------------------------
+
+Tests for `wg_gesucht.seen_ads` module.
+"""
+
+import os
+import csv
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from wg_gesucht.seen_ads import SeenAdsStore, CSV_HEADER
+
+
+class TestSeenAdsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.folder, "seen_ads.sqlite3")
+        self.csv_path = os.path.join(self.folder, "WG Ad Links.csv")
+
+    def test_imports_existing_csv_once(self):
+        with open(self.csv_path, "w", newline="", encoding="utf-8") as file:
+            csv_write = csv.writer(file)
+            csv_write.writerow(CSV_HEADER)
+            csv_write.writerow(["https://www.wg-gesucht.de/a.1.html", "Anna", "Ad 1"])
+
+        store = SeenAdsStore(self.db_path, csv_export_path=self.csv_path)
+        self.assertIn("https://www.wg-gesucht.de/a.1.html", store)
+        self.assertNotIn("WG Links", store)
+        self.assertEqual(len(store), 1)
+        store.close()
+
+        # also when the csv file isn't exported any more
+        os.remove(self.db_path)
+        store = SeenAdsStore(self.db_path, csv_import_path=self.csv_path)
+        self.assertIn("https://www.wg-gesucht.de/a.1.html", store)
+        self.assertIsNone(store.csv_export_path)
+        store.close()
+
+    def test_add_persists_and_exports(self):
+        store = SeenAdsStore(self.db_path, csv_export_path=self.csv_path)
+        self.assertTrue(store.add("https://www.wg-gesucht.de/b.2.html", "Ben", "Ad 2"))
+        self.assertFalse(store.add("https://www.wg-gesucht.de/b.2.html", "Ben", "Ad 2"))
+        store.close()
+
+        reopened = SeenAdsStore(self.db_path)
+        self.assertIn("https://www.wg-gesucht.de/b.2.html", reopened)
+        reopened.close()
+
+        with open(self.csv_path, newline="", encoding="utf-8") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(
+            rows, [CSV_HEADER, ["https://www.wg-gesucht.de/b.2.html", "Ben", "Ad 2"]]
+        )
+
+    def test_adds_written_in_batches(self):
+        store = SeenAdsStore(self.db_path, csv_export_path=self.csv_path, flush_size=3)
+        for number in range(2):
+            store.add("https://www.wg-gesucht.de/c.{}.html".format(number), "Clara", "Ad")
+        self.assertIn("https://www.wg-gesucht.de/c.1.html", store)
+        self.assertFalse(os.path.isfile(self.csv_path))
+
+        store.add("https://www.wg-gesucht.de/c.2.html", "Clara", "Ad")
+        with open(self.csv_path, newline="", encoding="utf-8") as file:
+            self.assertEqual(len(list(csv.reader(file))), 4)
+        self.assertEqual(store.flush(), 0)
+        store.close()
+
+    def test_flush_appends_to_csv(self):
+        store = SeenAdsStore(self.db_path, csv_export_path=self.csv_path)
+        store.add("https://www.wg-gesucht.de/e.5.html", "Emil", "Ad 5")
+        store.flush()
+        # added by hand, the database doesn't know it
+        with open(self.csv_path, "a", newline="", encoding="utf-8") as file:
+            csv.writer(file).writerow(["https://www.wg-gesucht.de/f.6.html", "Fay", "Ad 6"])
+
+        store.add("https://www.wg-gesucht.de/g.7.html", "Gus", "Ad 7")
+        store.close()
+        with open(self.csv_path, newline="", encoding="utf-8") as file:
+            urls = [row[0] for row in csv.reader(file)]
+        self.assertEqual(
+            urls,
+            [
+                CSV_HEADER[0],
+                "https://www.wg-gesucht.de/e.5.html",
+                "https://www.wg-gesucht.de/f.6.html",
+                "https://www.wg-gesucht.de/g.7.html",
+            ],
+        )
+
+    def test_ads_seen_under_any_url(self):
+        # a database from before the ad keys
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE seen_ads (url TEXT PRIMARY KEY, submitter TEXT, title TEXT)"
+        )
+        conn.execute(
+            "INSERT INTO seen_ads VALUES (?, ?, ?)",
+            ("https://www.wg-gesucht.de/wg-zimmer-in-Berlin-Mitte.4.html", "Dora", "Ad 4"),
+        )
+        conn.commit()
+        conn.close()
+
+        store = SeenAdsStore(self.db_path)
+        self.assertIn("http://localhost/wg-zimmer-in-Berlin-Wedding.4.html?ref=x", store)
+        self.assertNotIn("https://www.wg-gesucht.de/wohnungen-in-Berlin-Mitte.4.html", store)
+        self.assertFalse(
+            store.add("https://www.wg-gesucht.de/wg-zimmer-in-Berlin.4.html", "Dora", "Ad 4")
+        )
+        store.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_session_store
+----------------------------------
+
+Tests for `wg_gesucht.session_store` module and reusing a saved session, run against
+the local stub server.
+"""
+
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+from tests.stub_server import StubServer, make_crawler
+
+LOGIN_PATH = "/ajax/api/Smp/api.php?action=login"
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cookie_file = os.path.join(self.folder, ".session.json")
+
+    def crawler(self, stub, name):
+        return make_crawler(
+            os.path.join(self.folder, name),
+            stub=stub,
+            cookie_file=self.cookie_file,
+        )
+
+    def test_restart_reuses_session(self):
+        with StubServer(require_login=True) as stub:
+            self.crawler(stub, "first").start_session()
+            self.assertEqual(stub.requests.count(LOGIN_PATH), 1)
+            self.assertEqual(stat.S_IMODE(os.stat(self.cookie_file).st_mode), 0o600)
+
+            crawler = self.crawler(stub, "second")
+            crawler.start_session()
+            self.assertEqual(stub.requests.count(LOGIN_PATH), 1)
+            self.assertTrue(crawler.retrieve_email_template())
+
+            stub.expire_sessions()
+            self.crawler(stub, "third").start_session()
+            self.assertEqual(stub.requests.count(LOGIN_PATH), 2)
+
+    def test_signs_in_again_mid_cycle(self):
+        with StubServer(require_login=True) as stub:
+            crawler = self.crawler(stub, "crawler")
+            crawler.start_session()
+            stub.expire_sessions()
+
+            template_text, filters = crawler.get_account_settings()
+            self.assertTrue(template_text.startswith("Hallo,"))
+            self.assertEqual(stub.requests.count(LOGIN_PATH), 2)
+
+            crawler.email_apartments(crawler.fetch_ads(filters), template_text)
+            self.assertEqual(len(stub.messages), 5)
+            self.assertEqual(stub.requests.count(LOGIN_PATH), 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_startup
+----------------------------------
+
+Startup benchmark of the `wg-gesucht-crawler-cli` entry point, from the output of
+``python -X importtime``.
+"""
+
+import os
+import sys
+import subprocess
+import unittest
+
+import wg_gesucht
+from wg_gesucht import cli
+from wg_gesucht.parsers import PARSERS
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# only needed once the crawler starts searching
+DEFERRED_MODULES = ["requests", "bs4", "wg_gesucht.crawler"]
+
+
+def imported_modules(module):
+    """Returns the names of all modules loaded by `import module` in a fresh interpreter."""
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            "import sys, {}; print('\\n'.join(sorted(sys.modules)))".format(module),
+        ],
+        cwd=PACKAGE_ROOT,
+        universal_newlines=True,
+    )
+    return output.split()
+
+
+def import_times(module):
+    """
+    Returns {module name: cumulative import time in microseconds} for `import module`,
+    needs Python 3.7 for ``-X importtime``.
+    """
+    output = subprocess.check_output(
+        [sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+        cwd=PACKAGE_ROOT,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    times = dict()
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_cli_import_is_light(self):
+        modules = imported_modules("wg_gesucht.cli")
+        self.assertIn("wg_gesucht.cli", modules)
+        for module in DEFERRED_MODULES:
+            self.assertNotIn(module, modules)
+
+    @unittest.skipIf(sys.version_info < (3, 7), "-X importtime needs Python 3.7")
+    def test_cli_import_time(self):
+        times = import_times("wg_gesucht.cli")
+        sys.stdout.write(
+            "\nwg_gesucht.cli imported in {:.1f}ms\n".format(times["wg_gesucht.cli"] / 1000.0)
+        )
+
+    def test_parser_choices(self):
+        self.assertEqual(sorted(cli.PARSER_NAMES), sorted(PARSERS))
+
+    def test_version(self):
+        self.assertTrue(wg_gesucht.__version__)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_transport
+----------------------------------
+
+Tests for `wg_gesucht.transport` module.
+"""
+
+import unittest
+
+from wg_gesucht.transport import ConnectionMetrics, create_session
+from tests.stub_server import StubServer, FILTER_1, FILTER_2
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_default_timeout(self):
+        session = create_session(connect_timeout=3, read_timeout=7)
+        self.assertEqual(session.timeout, (3, 7))
+
+    def test_server_errors_retried(self):
+        session = create_session(retries=3, backoff_factor=0)
+        with StubServer(error_rate=0.3, seed=1) as stub:
+            statuses = [session.get(stub.base_url + FILTER_1).status_code for _ in range(5)]
+            session.close()
+
+        self.assertEqual(statuses, [200] * 5)
+        self.assertGreater(stub.errors, 0)
+        self.assertEqual(len(stub.requests), 5 + stub.errors)
+
+    def test_keep_alive_metrics(self):
+        session = create_session()
+        metrics = ConnectionMetrics(session)
+        with StubServer() as stub:
+            for _ in range(3):
+                session.get(stub.base_url + FILTER_1)
+                session.get(stub.base_url + FILTER_2)
+
+            self.assertEqual(
+                metrics.cycle(),
+                {"requests": 6, "connections_opened": 1, "connections_reused": 5},
+            )
+            self.assertEqual(metrics.cycle()["requests"], 0)
+            session.close()
@@ -0,0 +1,98 @@
+import re
+
+AD_ID_PATTERN = re.compile(r"\.(\d+)\.html")
+# the category an ad's URL starts with, and the ad type the messenger uses for it
+AD_TYPES = {"wg-zimmer": 0, "1-zimmer-wohnungen": 1, "wohnungen": 2, "haeuser": 3}
+AD_TYPE_PATTERN = re.compile(r"(?:^|/)({})-in-".format("|".join(AD_TYPES)))
+
+
+def ad_id_from_url(url):
+    """Returns the numeric id at the end of an ad URL, or None if there isn't one."""
+    match = AD_ID_PATTERN.search(url)
+    return int(match.group(1)) if match else None
+
+
+def ad_type_from_url(url):
+    """Returns the ad type (0 to 3) of an ad URL's category, or None if it has none."""
+    match = AD_TYPE_PATTERN.search(url)
+    return AD_TYPES[match.group(1)] if match else None
+
+
+def ad_key(url):
+    """
+    Identity of the ad behind a URL, "<ad type>:<ad id>", the same whatever the URL's
+    host, slug or query. The type is "?" if the URL has no category, and a URL without
+    an ad id is its own key.
+    """
+    ad_id = ad_id_from_url(url)
+    if ad_id is None:
+        return url
+    ad_type = ad_type_from_url(url)
+    return "{}:{}".format("?" if ad_type is None else ad_type, ad_id)
+
+
+class AdRecord:
+    """
+    Everything the crawler keeps about one ad on its way from the search results to
+    the sent message and the offline copy. Only plain values are kept, the parse tree
+    of the ad page is dropped as soon as the values have been read from it, and the
+    original response bytes are kept for the offline copy.
+    """
+
+    __slots__ = (
+        "url",
+        "ad_id",
+        "ad_type",
+        "title",
+        "submitter",
+        "post_date",
+        "contact_url",
+        "content",
+        "position",
+        "filter_url",
+        "discovered_at",
+    )
+
+    def __init__(
+        self,
+        url,
+        ad_id=None,
+        ad_type=None,
+        title="",
+        submitter="N/A",
+        post_date=None,
+        contact_url=None,
+        content=b"",
+        position=0,
+        filter_url=None,
+        discovered_at=None,
+    ):
+        self.url = url
+        self.ad_id = ad_id if ad_id is not None else ad_id_from_url(url)
+        self.ad_type = ad_type if ad_type is not None else ad_type_from_url(url)
+        self.title = title
+        self.submitter = submitter
+        self.post_date = post_date
+        self.contact_url = contact_url
+        self.content = content
+        # where and when the ad was found in the search results
+        self.position = position
+        self.filter_url = filter_url
+        self.discovered_at = discovered_at
+
+    @property
+    def key(self):
+        return ad_key(self.url)
+
+    def priority(self, weight=0):
+        """
+        Sort key which puts the freshest ads first: newest post date, then the position
+        in the filter's results. `weight` counts as extra days of freshness.
+        """
+        age = -self.post_date.toordinal() if self.post_date else 0
+        return (age - weight, self.position)
+
+    def __repr__(self):
+        return "AdRecord(url={!r}, ad_id={!r}, title={!r}, submitter={!r})".format(
+            self.url, self.ad_id, self.title, self.submitter
+        )
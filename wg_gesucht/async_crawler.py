@@ -0,0 +1,151 @@
+import time
+import asyncio
+from .page import Page
+from .transport import RequestFailed
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class AsyncFetchEngine:
+    """
+    Crawls all saved filters concurrently and returns the same ads as
+    `WgGesuchtCrawler.fetch_ads`.
+
+    Pages of a single filter are still fetched one after another, as each next page
+    link is only known once the previous page was parsed, but the filters themselves
+    are crawled side by side. Politeness is enforced globally: at most `max_in_flight`
+    requests are open at any time and every request takes a token from the crawler's
+    rate limiter, the same budget the rest of the crawler's requests use.
+    """
+
+    def __init__(self, crawler, max_in_flight=4):
+        if aiohttp is None:
+            raise RuntimeError(
+                "The async crawling engine needs 'aiohttp', install it with "
+                "'pip install wg-gesucht-crawler-cli[async]'"
+            )
+        self.crawler = crawler
+        self.logger = crawler.logger
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = crawler.rate_limiter
+
+    def fetch_ads(self, filters):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.fetch_ads_async(filters))
+        finally:
+            loop.close()
+
+    async def fetch_ads_async(self, filters):
+        self.logger.info(
+            "Searching %s filters concurrently for new ads (max %s requests in flight)",
+            len(filters),
+            self.max_in_flight,
+        )
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        cookies = {cookie.name: cookie.value for cookie in self.crawler.session.cookies}
+        headers = dict(self.crawler.session.headers)
+
+        connect_timeout, read_timeout = self.crawler.session.timeout
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout
+        )
+
+        async with aiohttp.ClientSession(
+            cookies=cookies, headers=headers, timeout=timeout
+        ) as http:
+            filter_ads = await asyncio.gather(
+                *[self.crawl_filter(http, semaphore, wg_filter) for wg_filter in filters]
+            )
+
+        return self.crawler.collect_ads([ad for ads in filter_ads for ad in ads])
+
+    async def get_page(self, http, semaphore, url):
+        """Like `WgGesuchtCrawler.get_page`, a refused request pauses and is made again."""
+        throttle = self.crawler.throttle
+        while True:
+            # paused requests don't hold on to the semaphore
+            await asyncio.sleep(throttle.remaining())
+            events_seen = throttle.events
+            page = await self.request_page(http, semaphore, url)
+            refused = self.crawler.refused(page)
+            if not refused:
+                throttle.success()
+                self.logger.info("%s: requested successfully", url)
+                return page
+            throttle.congestion(refused, events_seen)
+
+    async def request_page(self, http, semaphore, url):
+        async with semaphore:
+            timing = self.crawler.request_timings.start("results", url)
+            timing.sleep = delay = self.rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            started = time.perf_counter()
+            try:
+                async with http.get(url) as response:
+                    page = Page(
+                        str(response.url),
+                        await response.read(),
+                        response.status,
+                        response.headers,
+                        self.crawler.parser,
+                    )
+            except asyncio.TimeoutError:
+                self.logger.exception("Timed out trying to fetch %s", url)
+                raise RequestFailed(url)
+            except aiohttp.ClientConnectionError:
+                self.logger.exception("Could not connect to internet")
+                raise RequestFailed(url)
+            timing.network = time.perf_counter() - started
+            timing.status, timing.bytes = page.status_code, len(page.content)
+            page.timing = timing
+        if page.status_code >= 500:
+            self.logger.error("%s: HTTP %s", url, page.status_code)
+            raise RequestFailed(url)
+        return page
+
+    async def crawl_filter(self, http, semaphore, wg_filter):
+        crawler = self.crawler
+        filter_url = wg_filter
+        ad_list = list()
+        filter_results = list()
+        continue_next_page = True
+        while continue_next_page:
+            page = await self.get_page(http, semaphore, wg_filter)
+            tree = page.results_tree
+
+            list_view_href = crawler.find_list_view_href(tree)
+            if list_view_href:
+                page = await self.get_page(
+                    http, semaphore, "{}{}".format(crawler.base_url, list_view_href)
+                )
+                tree = page.results_tree
+
+            search_results, next_button_href = crawler.parse_search_results(tree)
+            if not filter_results:
+                crawler.poll_snapshots[filter_url] = crawler.row_ids(search_results)
+
+            # process_filter_results signals the date cutoff through the crawler's
+            # flag, there is no await between setting and reading it back
+            crawler.continue_next_page = True
+            ad_list.extend(
+                crawler.process_filter_results(
+                    search_results, filter_url, len(filter_results)
+                )
+            )
+            filter_results.extend(search_results)
+            continue_next_page = (
+                bool(next_button_href)
+                and crawler.continue_next_page
+                and not crawler.reached_watermark(filter_url, search_results)
+            )
+
+            if continue_next_page:
+                wg_filter = "{}{}".format(crawler.base_url, next_button_href)
+
+        crawler.remember_search(filter_url, filter_results, ad_list)
+        return ad_list
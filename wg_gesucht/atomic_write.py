@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+
+def write_atomically(path, data, permissions=0o644):
+    """
+    Writes `data` (bytes) to `path` so that it is never seen half written: it goes to a
+    temporary file next to `path`, is flushed to disk, and is then renamed over `path`.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        prefix=".", suffix=".part", dir=os.path.dirname(path) or "."
+    )
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            # without it a crash after the rename can leave an empty file behind
+            os.fsync(file.fileno())
+        os.chmod(temp_path, permissions)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
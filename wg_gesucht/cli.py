@@ -6,7 +6,37 @@ import click
 from .create_results_folders import create_folders
 from .logger import get_logger
 from . import user_details as user
-from .crawler import WgGesuchtCrawler
+
+# kept here rather than read from `parsers.PARSERS`, so that showing the help or
+# rejecting a bad option doesn't have to import the parser libraries
+PARSER_NAMES = ["html.parser", "lxml", "selectolax"]
+
+
+def parse_filter_weights(ctx, param, value):
+    """
+    Turns '--filter-weights' into a dict of lower case filter names to days, rejecting
+    anything that isn't a whole number of days before the crawler starts up.
+    """
+    weights = dict()
+    for weight in value.split(","):
+        if not weight.strip():
+            continue
+        if "=" not in weight:
+            raise click.BadParameter(
+                "'{}' should be a filter name and a number of days, e.g. 'Berlin WG=1'".format(
+                    weight.strip()
+                )
+            )
+        name, days = weight.rsplit("=", 1)
+        try:
+            weights[name.strip().lower()] = int(days)
+        except ValueError:
+            raise click.BadParameter(
+                "'{}' is not a whole number of days (for '{}')".format(
+                    days.strip(), name.strip()
+                )
+            )
+    return weights
 
 
 @click.command()
@@ -25,6 +55,111 @@ from .crawler import WgGesuchtCrawler
     is_flag=True,
     help="The script won't save your wg-gesucht login details for future use",
 )
+@click.option(
+    "--no-csv-export",
+    is_flag=True,
+    help="Don't keep 'WG Ad Links.csv' up to date, only use the seen ads database",
+)
+@click.option(
+    "--no-offline-copies",
+    is_flag=True,
+    help="Don't save a copy of every messaged ad in 'Offline Ad Links', which takes "
+    "one request less per message",
+)
+@click.option(
+    "--async-fetch",
+    is_flag=True,
+    help="Search all filters concurrently (needs 'aiohttp', install with the 'async' extra)",
+)
+@click.option(
+    "--max-in-flight",
+    default=4,
+    show_default=True,
+    help="Maximum number of concurrent requests when using --async-fetch",
+)
+@click.option(
+    "--request-interval",
+    default=5.0,
+    show_default=True,
+    help="Average number of seconds between requests once the burst is used up",
+)
+@click.option(
+    "--burst",
+    default=2,
+    show_default=True,
+    help="Number of requests that can be made back to back after being idle",
+)
+@click.option(
+    "--parser",
+    type=click.Choice(PARSER_NAMES),
+    default="html.parser",
+    show_default=True,
+    help="HTML parser used to read pages, 'lxml' and 'selectolax' are faster but need to be installed",
+)
+@click.option(
+    "--timeout",
+    default=30.0,
+    show_default=True,
+    help="Seconds to wait for wg-gesucht.de to respond before giving up on a request",
+)
+@click.option("--http2", is_flag=True, help="Use HTTP/2 if urllib3 and 'h2' support it")
+@click.option(
+    "--interval",
+    default=270,
+    show_default=True,
+    help="Seconds between the start of one search and the next",
+)
+@click.option(
+    "--interval-jitter",
+    default=30,
+    show_default=True,
+    help="Random number of seconds (up to) added to or taken from --interval",
+)
+@click.option(
+    "--cache-ttl",
+    default=3600,
+    show_default=True,
+    help="Seconds a cached page is revalidated with conditional requests before being dropped",
+)
+@click.option(
+    "--settings-refresh-cycles",
+    default=12,
+    show_default=True,
+    help="Re-read the template text and filters from your account every N searches "
+    "(also every hour, or straight away after 'kill -HUP')",
+)
+@click.option(
+    "--message-concurrency",
+    default=1,
+    show_default=True,
+    help="Number of ads fetched and messaged side by side, within the same request rate",
+)
+@click.option(
+    "--filter-weights",
+    default="",
+    callback=parse_filter_weights,
+    help="Days of freshness added to a filter's ads when ordering messages, "
+    "e.g. 'Berlin WG=1, Hamburg WG=-2'",
+)
+@click.option(
+    "--poll-interval",
+    default=0,
+    show_default=True,
+    help="Seconds between quick checks of only the first results page of each filter, "
+    "full searches still run every --interval seconds (0 turns polling off)",
+)
+@click.option(
+    "--export-timings",
+    is_flag=True,
+    help="Write the timing of every request to 'request_timings.jsonl' and the totals "
+    "to 'wg_gesucht.prom' (Prometheus text format) in the logs folder",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Run a single search without any pauses under the profiler, and write the "
+    "profile and a flame graph stack file to the logs folder",
+)
 def cli(
     change_email,
     change_password,
@@ -33,7 +168,25 @@ def cli(
     no_save,
     template,
     filter_names,
-    share_email
+    share_email,
+    no_csv_export,
+    no_offline_copies,
+    async_fetch,
+    max_in_flight,
+    request_interval,
+    burst,
+    parser,
+    timeout,
+    http2,
+    interval,
+    interval_jitter,
+    cache_ttl,
+    settings_refresh_cycles,
+    message_concurrency,
+    filter_weights,
+    poll_interval,
+    export_timings,
+    profile,
 ):
     """
     -------------------------Wg-Gesucht crawler-------------------------\n
@@ -50,6 +203,7 @@ def cli(
     logs_folder = os.path.join(dirname, "logs")
     user_folder = os.path.join(dirname, ".user")
     login_info_file = os.path.join(user_folder, ".login_info.json")
+    cookie_file = os.path.join(user_folder, ".session_cookies.json")
 
     if not os.path.exists(logs_folder):
         os.makedirs(os.path.join(dirname, "logs"))
@@ -101,9 +255,61 @@ def cli(
     if filter_names:
         filter_names = [filter.strip().lower() for filter in filter_names.split(",")]
 
+    # the crawler pulls in requests and the parsers, only import it once it's needed
+    from .crawler import WgGesuchtCrawler
+    from .rate_limiter import TokenBucket
+    from .transport import RequestFailed
+
+    sleep_recorder = None
+    if profile:
+        from .profiling import SleepRecorder
+
+        # the profile should show where the time goes, not the rate limiter's sleeps
+        sleep_recorder = SleepRecorder()
+        rate_limiter = TokenBucket(
+            rate=1 / request_interval, burst=burst, sleep=sleep_recorder
+        )
+    else:
+        rate_limiter = TokenBucket(rate=1 / request_interval, burst=burst)
+
     wg_gesucht = WgGesuchtCrawler(
-        login_info, wg_ad_links, offline_ad_links, logs_folder, template, filter_names, share_email
+        login_info,
+        wg_ad_links,
+        offline_ad_links,
+        logs_folder,
+        template,
+        filter_names,
+        share_email,
+        csv_export=not no_csv_export,
+        offline_copies=not no_offline_copies,
+        async_fetch=async_fetch,
+        max_in_flight=max_in_flight,
+        rate_limiter=rate_limiter,
+        parser=parser,
+        timeout=(10, timeout),
+        http2=http2,
+        interval=interval,
+        interval_jitter=interval_jitter,
+        cache_ttl=cache_ttl,
+        settings_refresh_cycles=settings_refresh_cycles,
+        message_concurrency=message_concurrency,
+        filter_weights=filter_weights,
+        poll_interval=poll_interval,
+        export_timings=export_timings,
+        cookie_file=None if no_save else cookie_file,
     )
-    wg_gesucht.sign_in()
+    if login_info_changed and os.path.isfile(cookie_file):
+        # the saved session may belong to the previous account
+        os.remove(cookie_file)
+    try:
+        wg_gesucht.start_session()
+    except RequestFailed:
+        # already logged, without a connection there is nothing to start with
+        sys.exit(1)
+    if profile:
+        from .profiling import profile_cycle
+
+        profile_cycle(wg_gesucht, sleep_recorder)
+        return
     logger.warning("Running until canceled, check info.log for details...")
     wg_gesucht.search()
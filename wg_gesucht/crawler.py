@@ -1,16 +1,43 @@
 import os
 import re
-import csv
 import sys
 import json
 import time
-import errno
-import random
+import signal
 import urllib
 import logging
 import datetime
+import threading
 import requests
-from bs4 import BeautifulSoup
+from .ads import AdRecord, ad_id_from_url, ad_key
+from .page import Page
+from .http_cache import ResponseCache
+from .parsers import get_parser
+from .seen_ads import SeenAdsStore
+from .session_store import load_cookies, save_cookies
+from .offline_archive import OfflineArchive
+from .pipeline import MessagePipeline
+from .scheduler import Scheduler
+from .rate_limiter import AdaptiveThrottle, TokenBucket
+from .request_timing import RequestTimings
+from .transport import ConnectionMetrics, RequestFailed, create_session, enable_http2
+
+
+# cleans up file name to allow saving (removes illegal file name characters)
+def text_replace(text):
+    text = re.sub(r"\bhttps://www.wg-gesucht.de/\b|[:/*?|<>&^%@#!]", "", text)
+    text = (
+        text.replace(":", "")
+        .replace("/", "")
+        .replace("\\", "")
+        .replace("*", "")
+        .replace("?", "")
+        .replace("|", "")
+        .replace("<", "")
+        .replace(">", "")
+        .replace("https://www.wg-gesucht.de/", "")
+    )
+    return text.rstrip().lstrip()
 
 
 class InfoFilter(logging.Filter):
@@ -28,6 +55,30 @@ class WgGesuchtCrawler:
         template,
         filter_names,
         share_email,
+        csv_export=True,
+        async_fetch=False,
+        max_in_flight=4,
+        base_url="https://www.wg-gesucht.de/",
+        rate_limiter=None,
+        parser="html.parser",
+        timeout=(10, 30),
+        pool_size=10,
+        retries=3,
+        http2=False,
+        interval=270,
+        interval_jitter=30,
+        cache_size=64,
+        cache_ttl=3600,
+        settings_refresh_cycles=12,
+        settings_refresh_interval=3600,
+        message_concurrency=1,
+        filter_weights=None,
+        poll_interval=0,
+        export_timings=False,
+        write_batch_size=50,
+        cookie_file=None,
+        captcha_pause=900,
+        offline_copies=True,
     ):
         self.login_info = login_info
         self.ad_links_folder = ad_links_folder
@@ -36,13 +87,87 @@ class WgGesuchtCrawler:
         self.template_name = template
         self.filter_names = filter_names
         self.share_email = share_email
-        self.submit_message_url = (
-            "https://www.wg-gesucht.de/ajax/api/Smp/api.php?action=conversations"
+        self.async_fetch = async_fetch
+        self.max_in_flight = max_in_flight
+        self.message_concurrency = message_concurrency
+        # filter name -> extra days of freshness given to the filter's ads
+        self.filter_weights = filter_weights or dict()
+        self.filter_labels = dict()
+        self.message_latencies = list()
+        self.time_to_first_message = None
+        self.time_to_freshest_message = None
+        self.base_url = base_url
+        self.submit_message_url = "{}ajax/api/Smp/api.php?action=conversations".format(
+            self.base_url
+        )
+        self.session = create_session(
+            connect_timeout=timeout[0],
+            read_timeout=timeout[1],
+            pool_size=pool_size,
+            retries=retries,
+        )
+        self.connection_metrics = ConnectionMetrics(self.session)
+        # the session cookies are saved here, so a restart can skip signing in
+        self.cookie_file = cookie_file
+        self._sign_in_lock = threading.Lock()
+        self.sign_ins = 0
+        self.request_timings = RequestTimings()
+        # JSON lines of every request and a Prometheus text file, in the logs folder
+        self.export_timings = export_timings
+        self.response_cache = ResponseCache(max_entries=cache_size, ttl=cache_ttl)
+        # every request goes through the same bucket to avoid reCAPTCHA
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.parser = get_parser(parser)
+        csv_path = os.path.join(ad_links_folder, "WG Ad Links.csv")
+        self.seen_ads = SeenAdsStore(
+            os.path.join(ad_links_folder, "seen_ads.sqlite3"),
+            csv_export_path=csv_path if csv_export else None,
+            flush_size=write_batch_size,
+            # the ads messaged before the database existed, also without the export
+            csv_import_path=csv_path,
         )
-        self.session = requests.Session()
         self.logger = self.get_logger()
+        self.offline_archive = OfflineArchive(
+            offline_ad_folder, flush_size=write_batch_size, logger=self.logger
+        )
+        # ads are messaged without their page, which is fetched after the message only
+        # to save it offline
+        self.offline_copies = offline_copies
+        # with polling on, the scheduler runs every `poll_interval` seconds and only
+        # every `interval` seconds a cycle is a full search
+        self.poll_interval = poll_interval
+        self.full_search_interval = interval
+        self.last_full_search = None
+        # filter URL -> hrefs of the rows on its first results page at the last check
+        self.poll_snapshots = dict()
+        # filter URL -> href of its first results page in list details view
+        self.list_view_hrefs = dict()
+        # filter URL -> its result rows and new ads, until the ads have been messaged
+        self.searched_filters = dict()
+        if poll_interval:
+            interval, interval_jitter = poll_interval, min(interval_jitter, poll_interval / 3)
+        self.scheduler = Scheduler(
+            self.run_cycle, interval=interval, jitter=interval_jitter, logger=self.logger
+        )
+        # learns the request rate wg-gesucht tolerates, instead of giving up on a captcha
+        self.throttle = AdaptiveThrottle(
+            self.rate_limiter,
+            pause=captcha_pause,
+            max_pause=max(captcha_pause * 4, 1),
+            state_file=os.path.join(ad_links_folder, "throttle.json"),
+            sleep=self.scheduler.wait,
+            logger=self.logger,
+        )
+        if http2 and not enable_http2():
+            self.logger.warning(
+                "HTTP/2 is not available, it needs urllib3 >= 2.3 and 'h2', using HTTP/1.1"
+            )
         self.counter = 1
         self.continue_next_page = True
+        self.settings_refresh_cycles = settings_refresh_cycles
+        self.settings_refresh_interval = settings_refresh_interval
+        self.account_settings = None
+        self.account_settings_fetched = (0, 0.0)
 
     def get_logger(self):
         formatter = logging.Formatter(
@@ -85,56 +210,182 @@ class WgGesuchtCrawler:
             "display_language": "de",
         }
 
+        login_url = "{}ajax/api/Smp/api.php?action=login".format(self.base_url)
+        timing = self.request_timings.start("login", login_url)
+        timing.sleep = self.rate_limiter.acquire()
+        started = time.perf_counter()
         try:
-            login = self.session.post(
-                "https://www.wg-gesucht.de/ajax/api/Smp/api.php?action=login",
-                json=payload,
-            )
+            login = self.session.post(login_url, json=payload)
         except requests.exceptions.Timeout:
             self.logger.exception("Timed out trying to log in")
-            sys.exit(1)
+            raise RequestFailed(login_url)
         except requests.exceptions.ConnectionError:
             self.logger.exception("Could not connect to internet")
-            sys.exit(1)
+            raise RequestFailed(login_url)
+        timing.network = time.perf_counter() - started
+        timing.status, timing.bytes = login.status_code, len(login.content)
 
-        if login.json() is True:
+        try:
+            signed_in = login.json() is True
+        except ValueError:
+            # an error page instead of the API's answer
+            self.logger.error(
+                "Could not log in, wg-gesucht.de answered HTTP %s", login.status_code
+            )
+            raise RequestFailed(login_url)
+        if signed_in:
             self.logger.info("Logged in successfully")
+            self.sign_ins += 1
+            self.save_session()
         else:
             self.logger.warning(
                 "Could not log into wg-gesucht.de with the given email and password"
             )
             sys.exit(1)
 
-    def get_page(self, url):
-        # randomise time between requests to avoid reCAPTCHA
-        time.sleep(random.randint(5, 8))
+    def save_session(self):
+        if self.cookie_file:
+            save_cookies(self.session, self.cookie_file)
+
+    def start_session(self):
+        """
+        Signs in, unless the session saved in `cookie_file` by an earlier run is still
+        signed in.
+        """
+        if self.cookie_file and load_cookies(self.session, self.cookie_file):
+            if self.session_valid():
+                self.logger.info("Reusing the saved session")
+                return
+            self.logger.info("Saved session has expired")
+            self.session.cookies.clear()
+        self.sign_in()
+
+    def session_valid(self):
+        """Probes a page which needs a signed in session."""
+        url = "{}mein-wg-gesucht-filter.html".format(self.base_url)
+        timing = self.request_timings.start("login", url)
+        timing.sleep = self.rate_limiter.acquire()
+        started = time.perf_counter()
         try:
-            page = self.session.get(url)
+            response = self.session.get(url)
+        except requests.exceptions.RequestException:
+            return False
+        timing.network = time.perf_counter() - started
+        timing.status, timing.bytes = response.status_code, len(response.content)
+        return not self.signed_out(response)
+
+    def signed_out(self, response):
+        """
+        wg-gesucht answers requests of an expired session by redirecting to the login
+        page, or with 401 / 403 for the API.
+        """
+        if response.status_code in (401, 403):
+            return True
+        return bool(response.history) and "login" in response.url.lower()
+
+    def sign_in_again(self, sign_ins_seen):
+        """
+        Signs in after a request came back signed out, unless another thread already
+        has since that request was made.
+        """
+        with self._sign_in_lock:
+            if self.sign_ins == sign_ins_seen:
+                self.logger.warning("Session has expired, signing in again")
+                self.sign_in()
+
+    def get_page(self, url, cache=False, stage="results"):
+        """
+        With `cache` set the request is sent as a conditional request, and an unchanged
+        page keeps what was extracted from it last time (see `parse_cached`). `stage`
+        labels the request in `request_timings`.
+
+        A reCAPTCHA or HTTP 429 slows the crawler down and pauses it (see
+        `AdaptiveThrottle`), then the request is made again.
+        """
+        while True:
+            self.wait_out_pause()
+            events_seen = self.throttle.events
+            page = self.request_page(url, cache, stage)
+            refused = self.refused(page)
+            if not refused:
+                self.throttle.success()
+                self.logger.info("%s: requested successfully", url)
+                return page
+            self.throttle.congestion(refused, events_seen)
+
+    def wait_out_pause(self):
+        if self.throttle.wait():
+            self.logger.warning("Stopped while paused")
+            sys.exit(0)
+
+    def request_page(self, url, cache=False, stage="results", sign_in=True, conditional=True):
+        """
+        A signed out reply signs in again and repeats the request once. So does a 304
+        for a page which has left the cache since its validators were read, without
+        them.
+        """
+        sign_ins_seen = self.sign_ins
+        headers = self.response_cache.validators(url) if cache and conditional else None
+        timing = self.request_timings.start(stage, url)
+        timing.sleep = self.rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers)
         except requests.exceptions.Timeout:
-            self.logger.exception("Timed out trying to log in")
-            sys.exit(1)
+            self.logger.exception("Timed out trying to fetch %s", url)
+            raise RequestFailed(url)
         except requests.exceptions.ConnectionError:
             self.logger.exception("Could not connect to internet")
-            sys.exit(1)
-
-        if self.no_captcha(page):
-            self.logger.info("%s: requested successfully", url)
-            return page
+            raise RequestFailed(url)
+        timing.network = time.perf_counter() - started
+        timing.status, timing.bytes = response.status_code, len(response.content)
+        if response.status_code >= 500:
+            # still failing after the retries, the site is down for now
+            self.logger.error("%s: HTTP %s", url, response.status_code)
+            raise RequestFailed(url)
+
+        if sign_in and self.signed_out(response):
+            self.sign_in_again(sign_ins_seen)
+            return self.request_page(url, cache, stage, sign_in=False, conditional=conditional)
+
+        cache_entry = None
+        if cache and response.status_code == 304:
+            cache_entry = self.response_cache.not_modified(url)
+            if cache_entry is None:
+                # expired while waiting for the rate limiter, nothing to reuse the 304 for
+                self.logger.info("%s: cached copy expired, requesting it in full", url)
+                return self.request_page(url, cache, stage, sign_in, conditional=False)
+        if cache_entry is not None:
+            page = Page(url, cache_entry.content, 200, response.headers, self.parser)
+        else:
+            page = Page.from_response(response, self.parser)
+            if cache and response.status_code == 200:
+                cache_entry = self.response_cache.store(url, response)
+        page.cache_entry = cache_entry
+        page.timing = timing
+        return page
+
+    def refused(self, page):
+        """Returns why wg-gesucht refused to serve the page, or None if it didn't."""
+        if page.status_code == 429:
+            return "HTTP 429 (Too Many Requests)"
+        if not self.no_captcha(page):
+            return "reCAPTCHA"
         return None
 
-    def no_captcha(self, page):
-        soup = BeautifulSoup(page.content, "html.parser")
-        recaptcha = soup.find_all("div", {"class": "g-recaptcha"})
+    def parse_cached(self, page, name, extract):
+        return self.response_cache.parsed(page, name, extract)
 
-        if recaptcha:
+    def no_captcha(self, page):
+        if page.has_captcha():
             self.logger.warning(
                 """
-                Sorry! A 'reCAPTCHA' has been detected, please sign into you WG-Gesucht
-                account through a browser and solve the 'reCAPTCHA', you may also have to
-                wait 15-20 mins before restarting
+                Sorry! A 'reCAPTCHA' has been detected, the crawler will pause and slow
+                down. Signing into your WG-Gesucht account through a browser and solving
+                the 'reCAPTCHA' may let it carry on sooner
                 """
             )
-            sys.exit(1)
+            return False
         else:
             return True
 
@@ -142,7 +393,9 @@ class WgGesuchtCrawler:
         self.logger.info("Retrieving email template...")
 
         template_page = self.get_page(
-            "https://www.wg-gesucht.de/mein-wg-gesucht-message-templates.html"
+            "{}mein-wg-gesucht-message-templates.html".format(self.base_url),
+            cache=True,
+            stage="template",
         )
 
         def no_template_error():
@@ -154,21 +407,21 @@ class WgGesuchtCrawler:
             )
             sys.exit(1)
 
-        soup = BeautifulSoup(template_page.content, "html.parser")
-        template_texts = [
-            text.find_all("div", {"class": "truncate_title"})
-            for text in soup.find_all("div", {"class": "panel-body"})
-        ]
+        template_texts = self.parse_cached(
+            template_page,
+            "template_texts",
+            lambda page: self.parser.template_texts(page.tree),
+        )
         try:
             if not self.template_name:
-                chosen_text = template_texts[0][1].text
+                chosen_text = template_texts[0][1]
             else:
                 chosen_text = list(
                     filter(
-                        lambda text: text[0].text.strip().lower() == self.template_name,
+                        lambda text: text[0].strip().lower() == self.template_name,
                         template_texts,
                     )
-                )[0][1].text
+                )[0][1]
         except IndexError:
             no_template_error()
 
@@ -179,21 +432,24 @@ class WgGesuchtCrawler:
 
     def fetch_filters(self):
         filters_page = self.get_page(
-            "https://www.wg-gesucht.de/mein-wg-gesucht-filter.html"
+            "{}mein-wg-gesucht-filter.html".format(self.base_url),
+            cache=True,
+            stage="filters",
         )
 
-        soup = BeautifulSoup(filters_page.content, "html.parser")
-
-        filter_results = soup.find_all(id=re.compile("^filter_name_"))
+        filter_results = self.parse_cached(
+            filters_page, "filter_links", lambda page: self.parser.filter_links(page.tree)
+        )
+        self.filter_labels = {href: name.strip().lower() for name, href in filter_results}
         filters_to_check = []
         if self.filter_names:
             filters_to_check = [
-                filter.get("href")
-                for filter in filter_results
-                if filter.text.strip().lower() in self.filter_names
+                href
+                for name, href in filter_results
+                if name.strip().lower() in self.filter_names
             ]
         else:
-            filters_to_check = [filter.get("href") for filter in filter_results]
+            filters_to_check = [href for name, href in filter_results]
 
         if self.filter_names and len(filters_to_check) != len(self.filter_names):
             self.logger.warning(
@@ -209,140 +465,289 @@ class WgGesuchtCrawler:
             self.logger.info("Filters found: %s", len(filters_to_check))
         return filters_to_check
 
+    def get_account_settings(self):
+        """
+        Returns the template text and the filters to check, only asking wg-gesucht for
+        them again every `settings_refresh_cycles` searches or `settings_refresh_interval`
+        seconds, whichever comes first, or after `refresh_account_settings`.
+        """
+        fetched_cycle, fetched_at = self.account_settings_fetched
+        if (
+            self.account_settings is None
+            or self.counter - fetched_cycle >= self.settings_refresh_cycles
+            or time.monotonic() - fetched_at >= self.settings_refresh_interval
+        ):
+            self.account_settings = (self.retrieve_email_template(), self.fetch_filters())
+            self.account_settings_fetched = (self.counter, time.monotonic())
+            # the filters may have been edited since
+            self.list_view_hrefs = dict()
+        return self.account_settings
+
+    def refresh_account_settings(self, *args):
+        """Makes the next search fetch the template text and filters again, also bound to SIGHUP."""
+        self.logger.info("Template text and filters will be refreshed on the next search")
+        self.account_settings = None
+
     def already_sent(self, href):
-        with open(
-            os.path.join(self.ad_links_folder, "WG Ad Links.csv"),
-            "rt",
-            encoding="utf-8",
-        ) as file:
-            wg_links_file_csv = csv.reader(file)
-            for wg_links_row in wg_links_file_csv:
-                if wg_links_row[0] == href:
-                    return True
-        return False
-
-    def change_to_list_details_view(self, soup, list_view_href=None):
-        view_type_links = soup.find_all("a", href=True, title=True)
-        if view_type_links[0]["title"] == "Listenansicht":
-            list_view_href = view_type_links[0]["href"]
+        return href in self.seen_ads
+
+    def find_list_view_href(self, tree):
+        return self.parser.list_view_href(tree)
+
+    def change_to_list_details_view(self, page, list_view_href=None):
+        if not list_view_href:
+            list_view_href = self.parse_cached(
+                page,
+                "list_view_href",
+                lambda page: self.find_list_view_href(page.results_tree),
+            )
 
         #  change gallery view to list details view
         if list_view_href:
-            details_results_page = self.get_page(
-                "https://www.wg-gesucht.de/{}".format(list_view_href)
-            )
-            soup = BeautifulSoup(details_results_page.content, "html.parser")
-        return soup
+            page = self.get_page("{}{}".format(self.base_url, list_view_href), cache=True)
+        return page
+
+    def first_results_page(self, filter_url):
+        """
+        Returns the filter's first results page in list details view. The list view href
+        is remembered, so later searches go straight to it.
+        """
+        list_view_href = self.list_view_hrefs.get(filter_url)
+        if list_view_href:
+            return self.get_page("{}{}".format(self.base_url, list_view_href), cache=True)
 
-    def process_filter_results(self, filter_results):
-        url_list = list()
-        for result in filter_results:
-            post_date_link = result.find("td", {"class": "ang_spalte_datum"}).find("a")
+        page = self.get_page(filter_url, cache=True)
+        list_view_href = self.parse_cached(
+            page, "list_view_href", lambda page: self.find_list_view_href(page.results_tree)
+        )
+        if list_view_href:
+            self.list_view_hrefs[filter_url] = list_view_href
+        return self.change_to_list_details_view(page, list_view_href)
+
+    def parse_search_results(self, tree):
+        """
+        Returns a `ResultRow` (href, post date) for each row of a list details view
+        page, and the href of the next page, which is None when the results have no
+        further pages.
+        """
+        return self.parser.search_results(tree)
+
+    def process_filter_results(self, filter_results, filter_url=None, position=0):
+        """
+        Returns an AdRecord for each new ad in the result rows, `position` is the number
+        of rows of the filter on earlier pages.
+        """
+        ad_list = list()
+        for offset, (href, post_date_text) in enumerate(filter_results):
             #  ignores ads older than 2 days
             try:
                 post_date = datetime.datetime.strptime(
-                    post_date_link.text.strip(), "%d.%m.%Y"
+                    post_date_text.strip(), "%d.%m.%Y"
                 ).date()
                 if post_date >= datetime.date.today() - datetime.timedelta(days=2):
-                    complete_href = "https://www.wg-gesucht.de/{}".format(
-                        post_date_link.get("href")
-                    )
+                    complete_href = "{}{}".format(self.base_url, href)
                     if not self.already_sent(complete_href):
-                        url_list.append(complete_href)
+                        ad_list.append(
+                            AdRecord(
+                                complete_href,
+                                post_date=post_date,
+                                position=position + offset,
+                                filter_url=filter_url,
+                                discovered_at=time.monotonic(),
+                            )
+                        )
                     else:
                         continue
                 else:
                     self.continue_next_page = False
             except ValueError:  # caught if ad is inactive or has no date
                 self.continue_next_page = False
-        return url_list
+        return ad_list
+
+    def ad_priority(self, ad):
+        return ad.priority(
+            self.filter_weights.get(self.filter_labels.get(ad.filter_url), 0)
+        )
+
+    def collect_ads(self, ad_list):
+        """
+        Drops ads found more than once, by more than one filter or under different URLs,
+        and orders them freshest first.
+        """
+        ads = dict()
+        for ad in ad_list:
+            key = ad.key
+            if key not in ads or self.ad_priority(ad) < self.ad_priority(ads[key]):
+                ads[key] = ad
+        ad_list = sorted(ads.values(), key=self.ad_priority)
+        self.logger.info("Number of apartments to email: %s", len(ad_list))
+        return ad_list
+
+    def reached_watermark(self, filter_url, filter_results):
+        """
+        True once a results page shows an ad at or below the filter's watermark, every
+        ad of the filter up to it has been messaged (or skipped) by an earlier search,
+        so the pages after this one don't need to be looked at.
+        """
+        watermark = self.seen_ads.watermark(filter_url)
+        if not watermark:
+            return False
+        return any(
+            ad_id is not None and ad_id <= watermark[0]
+            for ad_id in (ad_id_from_url(result.href) for result in filter_results)
+        )
+
+    def remember_search(self, filter_url, filter_results, ad_list):
+        """Keeps a searched filter's rows and new ads until `update_watermarks`."""
+        self.searched_filters[filter_url] = (filter_results, ad_list)
+
+    def update_watermarks(self):
+        """
+        Moves the watermark of each filter searched since the last call, once its ads
+        have been messaged.
+        """
+        searched_filters, self.searched_filters = self.searched_filters, dict()
+        for filter_url, (filter_results, ad_list) in searched_filters.items():
+            self.update_watermark(filter_url, filter_results, ad_list)
+
+    def update_watermark(self, filter_url, filter_results, ad_list):
+        """
+        Sets the watermark to the newest ad in the filter's results, but below the
+        oldest of its new ads which still hasn't been messaged (a failed message, or an
+        ad not reached before the crawler stopped), so the next search pages back to it.
+        """
+        ads = [
+            (ad_id_from_url(result.href), result.post_date.strip())
+            for result in filter_results
+        ]
+        ads = [ad for ad in ads if ad[0] is not None]
+        unsent = [
+            ad.ad_id
+            for ad in ad_list
+            if ad.ad_id is not None and not self.already_sent(ad.url)
+        ]
+        if unsent:
+            ads = [ad for ad in ads if ad[0] < min(unsent)] or [(min(unsent) - 1, None)]
+        if not ads:
+            return
+        newest_id, newest_post_date = max(ads)
+        watermark = self.seen_ads.watermark(filter_url)
+        if not watermark or newest_id != watermark[0]:
+            self.seen_ads.set_watermark(filter_url, newest_id, newest_post_date)
 
     def fetch_ads(self, filters):
         self.logger.info(
             "Searching filters for new ads, may take a while, depending on how many filters you "
             "have set up."
         )
-        url_list = list()
-        for wg_filter in filters:
-            # resets for each fitler, otherwise will immediately skip other filters
-            self.continue_next_page = True
-            while self.continue_next_page:
-                search_results_page = self.get_page(wg_filter)
+        ad_list = list()
+        for filter_url in filters:
+            ad_list.extend(self.crawl_filter(filter_url))
+        return self.collect_ads(ad_list)
+
+    def crawl_filter(self, filter_url):
+        ad_list = list()
+        filter_results = list()
+        # resets for each fitler, otherwise will immediately skip other filters
+        self.continue_next_page = True
+        search_results_page = self.first_results_page(filter_url)
+        while True:
+            search_results, next_button_href = self.parse_cached(
+                search_results_page,
+                "search_results",
+                lambda page: self.parse_search_results(page.results_tree),
+            )
+            if not next_button_href:
+                self.continue_next_page = False
+            if not filter_results:
+                self.poll_snapshots[filter_url] = self.row_ids(search_results)
 
-                soup = self.change_to_list_details_view(
-                    BeautifulSoup(search_results_page.content, "html.parser")
-                )
+            ad_list.extend(
+                self.process_filter_results(search_results, filter_url, len(filter_results))
+            )
+            filter_results.extend(search_results)
+            if self.reached_watermark(filter_url, search_results):
+                self.continue_next_page = False
 
-                link_table = soup.find("table", {"id": "table-compact-list"})
+            if not self.continue_next_page:
+                break
+            search_results_page = self.change_to_list_details_view(
+                self.get_page("{}{}".format(self.base_url, next_button_href), cache=True)
+            )
 
-                pagination = soup.find("ul", {"class": "pagination"})
-                if not pagination:
-                    self.continue_next_page = False
-                else:
-                    next_button_href = pagination.find_all("a")[-1].get("href")
-
-                #  gets each row from the search results table
-                search_results = link_table.find_all(
-                    "tr", {"class": ["listenansicht0", "listenansicht1"]}
-                )
-
-                url_list.extend(self.process_filter_results(search_results))
-
-                if self.continue_next_page:
-                    wg_filter = "https://www.wg-gesucht.de/{}".format(next_button_href)
-
-        self.logger.info("Number of apartments to email: %s", len(set(url_list)))
-        return set(url_list)
-
-    def get_info_from_ad(self, url):
-        # cleans up file name to allow saving (removes illegal file name characters)
-        def text_replace(text):
-            text = re.sub(r"\bhttps://www.wg-gesucht.de/\b|[:/*?|<>&^%@#!]", "", text)
-            text = (
-                text.replace(":", "")
-                .replace("/", "")
-                .replace("\\", "")
-                .replace("*", "")
-                .replace("?", "")
-                .replace("|", "")
-                .replace("<", "")
-                .replace(">", "")
-                .replace("https://www.wg-gesucht.de/", "")
+        self.remember_search(filter_url, filter_results, ad_list)
+        return ad_list
+
+    def row_ids(self, search_results):
+        return frozenset(ad_key(result.href) for result in search_results)
+
+    def poll_ads(self, filters):
+        """
+        Only checks the first results page of each filter, and returns the ads that
+        weren't on it at the previous check. A filter without a previous check, or whose
+        first page is all new ads (so more could be on the next pages), is searched in full.
+        """
+        ad_list = list()
+        for filter_url in filters:
+            snapshot = self.poll_snapshots.get(filter_url)
+            if snapshot is None:
+                ad_list.extend(self.crawl_filter(filter_url))
+                continue
+
+            search_results, next_button_href = self.parse_cached(
+                self.first_results_page(filter_url),
+                "search_results",
+                lambda page: self.parse_search_results(page.results_tree),
             )
-            return text.rstrip().lstrip()
+            row_ids = self.row_ids(search_results)
+            if row_ids == snapshot:
+                continue
+            if next_button_href and not row_ids & snapshot:
+                ad_list.extend(self.crawl_filter(filter_url))
+                continue
+
+            # the watermark is left to the full searches, which page through everything
+            self.poll_snapshots[filter_url] = row_ids
+            new_results = [
+                result for result in search_results if ad_key(result.href) not in snapshot
+            ]
+            ad_list.extend(self.process_filter_results(new_results, filter_url))
+
+        if ad_list:
+            return self.collect_ads(ad_list)
+        return ad_list
+
+    def full_search_due(self):
+        return (
+            not self.poll_interval
+            or self.account_settings is None
+            or self.last_full_search is None
+            or time.monotonic() - self.last_full_search >= self.full_search_interval
+        )
 
-        ad_page = self.get_page(url)
+    def fetch_ads_async(self, filters):
+        from .async_crawler import AsyncFetchEngine
 
-        ad_page_soup = BeautifulSoup(ad_page.content, "html.parser")
+        engine = AsyncFetchEngine(self, max_in_flight=self.max_in_flight)
+        return engine.fetch_ads(filters)
 
-        ad_title = text_replace(ad_page_soup.find("title").text)
-        ad_url = text_replace(url)
+    def get_info_from_ad(self, ad):
+        if not isinstance(ad, AdRecord):
+            ad = AdRecord(ad)
+        ad_page = self.get_page(ad.url, stage="ad")
 
-        return {
-            "ad_page_soup": ad_page_soup,
-            "ad_title": ad_title,
-            "ad_submitter": "N/A",
-            "ad_url": ad_url,
-        }
+        # the parse tree is only needed here, the record keeps the raw bytes
+        ad.title = text_replace(self.parser.page_title(ad_page.tree))
+        ad.contact_url = self.parser.contact_href(ad_page.tree)
+        ad.content = ad_page.content
+        return ad
 
-    def update_files(self, url, ad_info):
+    def update_files(self, ad):
         MAX_FILENAME_LENGTH = 245
 
-        ad_page_soup, ad_title, ad_submitter, ad_url = (
-            ad_info["ad_page_soup"],
-            ad_info["ad_title"],
-            ad_info["ad_submitter"],
-            ad_info["ad_url"],
-        )
-        # save url to file, so as not to send a message to them again
-        with open(
-            os.path.join(self.ad_links_folder, "WG Ad Links.csv"),
-            "a",
-            newline="",
-            encoding="utf-8",
-        ) as file_write:
-            csv_file_write = csv.writer(file_write)
-            csv_file_write.writerow([url, ad_submitter, ad_title])
+        ad_title, ad_submitter, ad_url = ad.title, ad.submitter, text_replace(ad.url)
+        # save url to the seen ads store, so as not to send a message to them again
+        self.seen_ads.add(ad.url, ad_submitter, ad_title)
 
         # save a copy of the ad for offline viewing, in case the ad is deleted before the user can view it online
         max_ad_title_length = MAX_FILENAME_LENGTH - len(ad_submitter) - len(ad_url)
@@ -350,131 +755,299 @@ class WgGesuchtCrawler:
             ad_title = ad_title[: max_ad_title_length - 1] + "..."
 
         file_name = "{}-{}-{}".format(ad_submitter, ad_title, ad_url)
-        try:
-            with open(
-                os.path.join(self.offline_ad_folder, file_name), "w", encoding="utf-8"
-            ) as outfile:
-                outfile.write(str(ad_page_soup))
-        except OSError as err:
-            if err.errno == errno.ENAMETOOLONG:
-                self.logger.exception(
-                    "File name of {} is too long, could not save this ad offline".format(
-                        file_name
-                    )
-                )
+        if ad.content:
+            self.offline_archive.add(file_name, ad.content)
+
+    def flush_files(self):
+        """Writes out the seen ads and offline copies still waiting in memory."""
+        self.seen_ads.flush()
+        self.offline_archive.flush()
 
     def get_payload(self, submit_form, template_text):
         return {
-            "user_id": submit_form.find(attrs={"name": "user_id"})["value"],
-            "ad_type": submit_form.find(attrs={"name": "ad_type"})["value"],
-            "ad_id": submit_form.find(attrs={"name": "ad_id"})["value"],
-            "csrf_token": submit_form.find(attrs={"name": "csrf_token"})["value"],
+            "user_id": submit_form["user_id"],
+            "ad_type": submit_form["ad_type"],
+            "ad_id": submit_form["ad_id"],
+            "csrf_token": submit_form["csrf_token"],
             "messages": [{"content": template_text, "message_type": "text"}],
         }
 
-    def email_apartment(self, url, template_text):
-        ad_info = self.get_info_from_ad(url)
+    def messenger_url(self, ad):
+        return "{}nachricht-senden.html?message_ad_id={}&ad_type={}".format(
+            self.base_url, ad.ad_id, ad.ad_type
+        )
 
-        try:
-            send_message_url = (
-                ad_info["ad_page_soup"]
-                .find("a", {"class": "btn btn-block btn-md wgg_orange"})
-                .get("href")
-            )
-        except AttributeError:
+    def fetch_messenger_form(self, ad):
+        """
+        Fetches the messenger form page straight from the id and type in the ad's URL,
+        without the ad page. Returns None if the URL doesn't have them or the page has
+        no form.
+        """
+        if ad.ad_id is None or ad.ad_type is None:
+            return None
+        contact_url = self.messenger_url(ad)
+        submit_form_page = self.get_page(contact_url, stage="form")
+        if not self.parser.messenger_form(submit_form_page.tree):
+            self.logger.info("%s: no messenger form, trying the ad page", contact_url)
+            return None
+        ad.contact_url = contact_url
+        ad.title = text_replace(self.parser.page_title(submit_form_page.tree))
+        return submit_form_page
+
+    def fetch_ad(self, ad):
+        """
+        Fetches an ad's (an AdRecord or URL) messenger form page, going through the ad
+        page for its contact button if the form can't be fetched directly. Returns the
+        AdRecord and the form page, which is None when the ad has no contact button.
+        """
+        if not isinstance(ad, AdRecord):
+            ad = AdRecord(ad)
+        submit_form_page = self.fetch_messenger_form(ad)
+        if submit_form_page is not None:
+            return ad, submit_form_page
+
+        ad = self.get_info_from_ad(ad)
+
+        if not ad.contact_url:
             self.logger.exception(
                 "Could not find submit form, you have possibly already sent a message to this user"
             )
-            self.update_files(url, ad_info)
-            return
+            self.update_files(ad)
+            return ad, None
+        return ad, self.get_page(ad.contact_url, stage="form")
 
-        submit_form_page = self.get_page(send_message_url)
-        submit_form_page_soup = BeautifulSoup(submit_form_page.content, "html.parser")
-        submit_form = submit_form_page_soup.find("form", {"id": "messenger_form"})
+    def prepare_message(self, ad, submit_form_page, template_text):
+        """Reads the messenger form, returns the message payload or None if there isn't one."""
+        submit_form = self.parser.messenger_form(submit_form_page.tree)
 
         if not submit_form:
             self.logger.exception(
                 "Could not find submit form, you have possibly already sent a message to this user"
             )
-            self.update_files(url, ad_info)
-            return
-        
-        ad_submitter = (
-            submit_form_page_soup.find(
-                attrs={"class": "control-label", "for": "message_input"}
-            )
-            .text.replace("Nachricht an ", "")
+            self.update_files(ad)
+            return None
+
+        ad.submitter = (
+            (self.parser.message_recipient(submit_form_page.tree) or "")
+            .replace("Nachricht an ", "")
             .replace(":", "")
             .rstrip()
             .lstrip()
         )
-        ad_info["ad_submitter"] = ad_submitter
 
+        try:
+            return self.get_payload(submit_form, template_text)
+        except KeyError:
+            self.logger.exception(
+                "Could not find submit form, you have possibly already sent a message to this user"
+            )
+            self.update_files(ad)
+            return None
+
+    def send_message(self, ad, payload):
         headers = {
             "Content-Type": "application/json",
             "Cache-Control": "no-cache",
-            "Referer": send_message_url,
+            "Referer": ad.contact_url,
             "Accept": "application/json, text/javascript, */*",
-            "Origin": "https://www.wg-gesucht.de",
+            "Origin": self.base_url.rstrip("/"),
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36",
         }
 
-        try:
-            payload = self.get_payload(submit_form, template_text)
-        except AttributeError:
-            self.logger.exception(
-                "Could not find submit form, you have possibly already sent a message to this user"
-            )
-            self.update_files(url, ad_info)
-            return
-
         json_data = json.dumps(payload)
 
+        self.wait_out_pause()
+        sign_ins_seen, events_seen = self.sign_ins, self.throttle.events
+        timing = self.request_timings.start("send", self.submit_message_url)
+        timing.sleep = self.rate_limiter.acquire()
+        started = time.perf_counter()
         try:
-            sent_message = self.session.post(
+            response = self.session.post(
                 self.submit_message_url, data=json_data, headers=headers
-            ).json()
+            )
         except requests.exceptions.Timeout:
             self.logger.exception(
                 "Timed out sending a message to %s, will try again next time",
-                ad_info["ad_submitter"],
+                ad.submitter,
+            )
+            return
+        except requests.exceptions.ConnectionError:
+            self.logger.exception("Could not connect to internet")
+            raise RequestFailed(self.submit_message_url)
+        timing.network = time.perf_counter() - started
+        timing.status, timing.bytes = response.status_code, len(response.content)
+
+        if self.signed_out(response):
+            # the form's csrf token belongs to the expired session, so not sent again now
+            self.sign_in_again(sign_ins_seen)
+            self.logger.warning(
+                "Session had expired sending a message to %s, will try again next time",
+                ad.submitter,
+            )
+            return
+        if response.status_code == 429:
+            self.throttle.congestion("HTTP 429 (Too Many Requests)", events_seen)
+            self.logger.warning(
+                "Too many requests sending a message to %s, will try again next time",
+                ad.submitter,
+            )
+            return
+        if response.status_code >= 500:
+            self.logger.warning(
+                "HTTP %s sending a message to %s, will try again next time",
+                response.status_code,
+                ad.submitter,
             )
             return
+        self.throttle.success()
+        try:
+            sent_message = response.json()
+        except ValueError:
+            # an error page instead of the API's answer
+            sent_message = dict()
 
         if not sent_message.get("conversation_id", None):
             self.logger.warning(
                 "Failed to send message to %s, will try again next time",
-                ad_info["ad_submitter"],
+                ad.submitter,
             )
             return
 
-        self.update_files(url, ad_info)
+        if ad.discovered_at is not None:
+            self.message_latencies.append(
+                (self.ad_priority(ad), time.monotonic() - ad.discovered_at)
+            )
         time_now = datetime.datetime.now().strftime("%H:%M:%S")
-        self.logger.info("Message Sent to %s at %s!", ad_info["ad_submitter"], time_now)
+        self.logger.info("Message Sent to %s at %s!", ad.submitter, time_now)
 
-    def search(self):
+        try:
+            if self.offline_copies and not ad.content:
+                # the message is out, the ad page is only needed for the offline copy
+                self.get_info_from_ad(ad)
+        finally:
+            self.update_files(ad)
+
+    def email_apartment(self, ad, template_text):
+        ad, submit_form_page = self.fetch_ad(ad)
+        if submit_form_page is None:
+            return
+
+        payload = self.prepare_message(ad, submit_form_page, template_text)
+        if payload is None:
+            return
+
+        self.send_message(ad, payload)
+
+    def email_apartments(self, ad_list, template_text):
+        """Messages the ads (AdRecords or URLs), freshest ads first."""
+        ad_list = [ad if isinstance(ad, AdRecord) else AdRecord(ad) for ad in ad_list]
+        self.message_latencies = list()
+        try:
+            if self.message_concurrency > 1:
+                MessagePipeline(self, self.message_concurrency).run(ad_list, template_text)
+            else:
+                for ad in sorted(ad_list, key=self.ad_priority):
+                    self.email_apartment(ad, template_text)
+        finally:
+            # one write of everything messaged in this batch, also if it was given up
+            self.flush_files()
+            self.update_watermarks()
+
+        if self.message_latencies:
+            # latency from finding an ad in the results to its message being sent
+            self.time_to_first_message = self.message_latencies[0][1]
+            self.time_to_freshest_message = min(self.message_latencies)[1]
+            self.logger.info(
+                "Time to first message: %.1fs, to the freshest ad's message: %.1fs",
+                self.time_to_first_message,
+                self.time_to_freshest_message,
+            )
+
+    def run_cycle(self):
         if self.counter < 2:
             self.logger.debug("Starting...")
         else:
             self.logger.info("Resuming...")
 
-        template_text = self.retrieve_email_template()
+        full_search = self.full_search_due()
+        try:
+            if not full_search:
+                # quick check between full searches, the settings are only refreshed on those
+                template_text, filters_to_check = self.account_settings
+                ad_list = self.poll_ads(filters_to_check)
+            else:
+                template_text, filters_to_check = self.get_account_settings()
+                self.last_full_search = time.monotonic()
+                if self.async_fetch:
+                    ad_list = self.fetch_ads_async(filters_to_check)
+                else:
+                    ad_list = self.fetch_ads(filters_to_check)
 
-        filters_to_check = self.fetch_filters()
+            self.email_apartments(ad_list, template_text)
+        except RequestFailed:
+            # the connection is down, the scheduler tries again at the next interval
+            self.logger.warning("Gave up on this search, will try again at the next one")
+            if full_search:
+                self.last_full_search = None
 
-        ad_list = self.fetch_ads(filters_to_check)
+        connections = self.connection_metrics.cycle()
+        self.logger.info(
+            "Connections: %s requests, %s new connections, %s reused",
+            connections["requests"],
+            connections["connections_opened"],
+            connections["connections_reused"],
+        )
 
-        for ad_url in ad_list:
-            self.email_apartment(ad_url, template_text)
+        limiter_stats = self.rate_limiter.stats()
+        self.logger.info(
+            "Request rate: %.2f/min, waited %.1fs in total over %s requests (max wait %.1fs)",
+            limiter_stats["current_rate"] * 60,
+            limiter_stats["total_wait"],
+            limiter_stats["requests"],
+            limiter_stats["max_wait"],
+        )
+        self.report_timings()
+        # cookies the server renewed during the search
+        self.save_session()
 
         time_now = datetime.datetime.now().strftime("%H:%M:%S")
-        self.logger.info("Program paused at %s... Will resume in 4-5 minutes", time_now)
+        self.logger.info("Program paused at %s", time_now)
         self.logger.info(
             "WG-Gesucht checked %s %s since running",
             self.counter,
             "time" if self.counter <= 1 else "times",
         )
-        # pauses for 4-5 mins before searching again
-        time.sleep(random.randint(240, 300))
         self.counter += 1
-        self.search()
+
+    def report_timings(self):
+        """Logs where the time of this search's requests went, and exports them if enabled."""
+        records, summary = self.request_timings.end_cycle()
+        for stage, values in sorted(summary.items()):
+            self.logger.info(
+                "%s: %s requests, %.2fs waiting, %.2fs network, %.2fs parsing, %s KiB",
+                stage,
+                values["requests"],
+                values["sleep"],
+                values["network"],
+                values["parse"],
+                values["bytes"] // 1024,
+            )
+        if self.export_timings:
+            self.request_timings.write_json_lines(
+                os.path.join(self.logs_folder, "request_timings.jsonl"), records, self.counter
+            )
+            self.request_timings.write_prometheus(
+                os.path.join(self.logs_folder, "wg_gesucht.prom")
+            )
+
+    def search(self):
+        # searches again every 4-5 mins until stopped
+        self.scheduler.install_signal_handlers()
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.refresh_account_settings)
+        try:
+            self.scheduler.run()
+        finally:
+            # SIGTERM lets the running search finish, anything it left is written here
+            self.flush_files()
+            self.update_watermarks()
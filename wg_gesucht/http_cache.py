@@ -0,0 +1,106 @@
+import time
+import hashlib
+import collections
+
+
+class CacheEntry:
+    __slots__ = ("url", "etag", "last_modified", "content", "content_hash", "stored_at", "parsed")
+
+    def __init__(self, url, etag, last_modified, content, content_hash, stored_at):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content = content
+        self.content_hash = content_hash
+        self.stored_at = stored_at
+        # values extracted from `content`, by name
+        self.parsed = dict()
+
+
+class ResponseCache:
+    """
+    Keeps the last response of cached URLs together with their ETag / Last-Modified
+    validators and whatever was extracted from them.
+
+    Requests for a cached URL are sent as conditional requests; a 304 reply, or a new
+    body with the same content hash as before, reuses the stored extraction results
+    so the page doesn't have to be parsed again. Entries expire `ttl` seconds after
+    they were last confirmed, and the least recently used entries are dropped once
+    there are more than `max_entries`.
+    """
+
+    def __init__(self, max_entries=64, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url):
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        if self._clock() - entry.stored_at > self.ttl:
+            del self._entries[url]
+            return None
+        self._entries.move_to_end(url)
+        return entry
+
+    def validators(self, url):
+        """Headers which turn a request for `url` into a conditional request."""
+        entry = self.get(url)
+        headers = dict()
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def not_modified(self, url):
+        """Called on a 304 reply, returns the stored entry."""
+        entry = self.get(url)
+        if entry is not None:
+            entry.stored_at = self._clock()
+            self.hits += 1
+        return entry
+
+    def store(self, url, response):
+        """Called on a full reply, keeps the previous extraction results if the body didn't change."""
+        content_hash = hashlib.sha1(response.content).hexdigest()
+        previous = self._entries.pop(url, None)
+
+        entry = CacheEntry(
+            url,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            response.content,
+            content_hash,
+            self._clock(),
+        )
+        if previous is not None and previous.content_hash == content_hash:
+            entry.parsed = previous.parsed
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        self._entries[url] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def parsed(self, page, name, extract):
+        """
+        Returns `extract(page)`, computed only once per distinct body of a cached page.
+        """
+        entry = getattr(page, "cache_entry", None)
+        if entry is None:
+            return extract(page)
+        if name not in entry.parsed:
+            entry.parsed[name] = extract(page)
+        return entry.parsed[name]
@@ -0,0 +1,64 @@
+import os
+import errno
+import logging
+import threading
+
+from .atomic_write import write_atomically
+
+
+class OfflineArchive:
+    """
+    Offline copies of the messaged ads, in case an ad is deleted before the user can
+    view it online.
+
+    Pages are kept in memory and written to `folder` by `flush`, once `flush_size` of
+    them are waiting or when the crawler flushes at the end of a search. Each file is
+    written with `write_atomically`, so the folder never holds half written pages.
+    """
+
+    def __init__(self, folder, flush_size=20, logger=None):
+        self.folder = folder
+        self.flush_size = flush_size
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._pending = list()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, file_name, content):
+        with self._lock:
+            self._pending.append((file_name, content))
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the waiting pages, returns how many were written. If the disk fails the
+        pages not written yet are kept for the next flush.
+        """
+        with self._lock:
+            pages, self._pending = self._pending, list()
+
+        written = 0
+        for index, (file_name, content) in enumerate(pages):
+            try:
+                write_atomically(os.path.join(self.folder, file_name), content)
+                written += 1
+            except OSError as err:
+                if err.errno == errno.ENAMETOOLONG:
+                    self.logger.exception(
+                        "File name of {} is too long, could not save this ad offline".format(
+                            file_name
+                        )
+                    )
+                    continue
+                self.logger.exception(
+                    "Could not save %s ads offline, will try again later",
+                    len(pages) - index,
+                )
+                with self._lock:
+                    self._pending[:0] = pages[index:]
+                break
+        return written
@@ -0,0 +1,60 @@
+import time
+
+from .parsers import DEFAULT_PARSER
+
+
+class Page:
+    """
+    A fetched page which builds its parse tree at most once, the first time `tree` is
+    used, so the captcha check and the caller share the same parse.
+    """
+
+    def __init__(self, url, content, status_code=200, headers=None, parser=None):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or dict()
+        self.parser = parser or DEFAULT_PARSER
+        self._tree = None
+        self._results_tree = None
+        # set by the crawler when the page went through its response cache
+        self.cache_entry = None
+        # set by the crawler, the RequestTiming parse time is added to
+        self.timing = None
+
+    @classmethod
+    def from_response(cls, response, parser=None):
+        return cls(
+            response.url,
+            response.content,
+            response.status_code,
+            response.headers,
+            parser,
+        )
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            started = time.perf_counter()
+            self._tree = self.parser.parse(self.content)
+            self.record_parse(started)
+        return self._tree
+
+    @property
+    def results_tree(self):
+        """Partial tree of a search results page, see `parse_results` of the parser."""
+        if self._results_tree is None:
+            started = time.perf_counter()
+            self._results_tree = self.parser.parse_results(self.content)
+            self.record_parse(started)
+        return self._results_tree
+
+    def record_parse(self, started):
+        if self.timing is not None:
+            self.timing.parse += time.perf_counter() - started
+
+    def has_captcha(self):
+        # cheap byte level pre-check, only build the tree if the marker is there at all
+        if b"g-recaptcha" not in self.content:
+            return False
+        return self.parser.has_captcha(self.tree)
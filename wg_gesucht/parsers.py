@@ -0,0 +1,216 @@
+"""
+HTML parser backends.
+
+Every piece of information the crawler reads from wg-gesucht.de goes through one of
+these classes, so the tree builder can be swapped without touching the crawling
+logic. All backends return plain strings, lists and dicts, and must give identical
+results for the same page.
+"""
+
+import re
+import collections
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # pragma: no cover
+    LexborHTMLParser = None
+
+CONTACT_BUTTON_CLASS = "btn btn-block btn-md wgg_orange"
+RESULT_ROW_CLASSES = ["listenansicht0", "listenansicht1"]
+
+# a search results page is only read for the results table, the pagination and the
+# view toggle links, everything else can be skipped while parsing
+RESULTS_PAGE_STRAINER = SoupStrainer(["table", "ul", "a"])
+
+ResultRow = collections.namedtuple("ResultRow", ["href", "post_date"])
+
+
+class SoupParser:
+    """Extracts page content with BeautifulSoup, using the `features` tree builder."""
+
+    def __init__(self, features="html.parser"):
+        try:
+            BeautifulSoup("", features)
+        except FeatureNotFound:
+            raise RuntimeError(
+                "The '{0}' parser is not installed, install it with "
+                "'pip install {0}'".format(features)
+            )
+        self.features = features
+        self.name = features
+
+    def parse(self, content):
+        return BeautifulSoup(content, self.features)
+
+    def parse_results(self, content):
+        """Builds a partial tree holding only what is read from a search results page."""
+        return BeautifulSoup(content, self.features, parse_only=RESULTS_PAGE_STRAINER)
+
+    def has_captcha(self, tree):
+        return bool(tree.find_all("div", {"class": "g-recaptcha"}))
+
+    def page_title(self, tree):
+        return tree.find("title").text
+
+    def template_texts(self, tree):
+        return [
+            [div.text for div in panel.find_all("div", {"class": "truncate_title"})]
+            for panel in tree.find_all("div", {"class": "panel-body"})
+        ]
+
+    def filter_links(self, tree):
+        return [
+            (link.text, link.get("href"))
+            for link in tree.find_all(id=re.compile("^filter_name_"))
+        ]
+
+    def list_view_href(self, tree):
+        view_type_links = tree.find_all("a", href=True, title=True)
+        if view_type_links and view_type_links[0]["title"] == "Listenansicht":
+            return view_type_links[0]["href"]
+        return None
+
+    def iter_result_rows(self, tree):
+        link_table = tree.find("table", {"id": "table-compact-list"})
+        if not link_table:
+            return
+        for result in link_table.find_all("tr", {"class": RESULT_ROW_CLASSES}):
+            post_date_cell = result.find("td", {"class": "ang_spalte_datum"})
+            post_date_link = post_date_cell.find("a") if post_date_cell else None
+            if post_date_link:
+                yield ResultRow(post_date_link.get("href"), post_date_link.text)
+
+    def next_page_href(self, tree):
+        pagination = tree.find("ul", {"class": "pagination"})
+        if pagination:
+            page_links = pagination.find_all("a")
+            if page_links:
+                return page_links[-1].get("href")
+        return None
+
+    def search_results(self, tree):
+        return list(self.iter_result_rows(tree)), self.next_page_href(tree)
+
+    def contact_href(self, tree):
+        contact_button = tree.find("a", {"class": CONTACT_BUTTON_CLASS})
+        return contact_button.get("href") if contact_button else None
+
+    def messenger_form(self, tree):
+        submit_form = tree.find("form", {"id": "messenger_form"})
+        if not submit_form:
+            return None
+        fields = dict()
+        for field in submit_form.find_all(attrs={"name": True}):
+            fields.setdefault(field["name"], field.get("value"))
+        return fields
+
+    def message_recipient(self, tree):
+        label = tree.find(attrs={"class": "control-label", "for": "message_input"})
+        return label.text if label else None
+
+
+class SelectolaxParser:
+    """
+    Extracts page content with selectolax's lexbor engine, a C HTML5 parser which is
+    several times faster than BeautifulSoup on low powered machines.
+    """
+
+    name = "selectolax"
+
+    def __init__(self):
+        if LexborHTMLParser is None:
+            raise RuntimeError(
+                "The 'selectolax' parser needs 'selectolax', install it with "
+                "'pip install wg-gesucht-crawler-cli[selectolax]'"
+            )
+
+    def parse(self, content):
+        return LexborHTMLParser(content)
+
+    def parse_results(self, content):
+        # lexbor builds the whole tree faster than the filtering would save
+        return self.parse(content)
+
+    def has_captcha(self, tree):
+        return tree.css_first("div.g-recaptcha") is not None
+
+    def page_title(self, tree):
+        return tree.css_first("title").text(deep=True)
+
+    def template_texts(self, tree):
+        return [
+            [div.text(deep=True) for div in panel.css("div.truncate_title")]
+            for panel in tree.css("div.panel-body")
+        ]
+
+    def filter_links(self, tree):
+        return [
+            (link.text(deep=True), link.attributes.get("href"))
+            for link in tree.css('[id^="filter_name_"]')
+        ]
+
+    def list_view_href(self, tree):
+        view_type_link = tree.css_first("a[href][title]")
+        if view_type_link and view_type_link.attributes["title"] == "Listenansicht":
+            return view_type_link.attributes["href"]
+        return None
+
+    def iter_result_rows(self, tree):
+        link_table = tree.css_first("table#table-compact-list")
+        if not link_table:
+            return
+        for result in link_table.css("tr.listenansicht0, tr.listenansicht1"):
+            post_date_link = result.css_first("td.ang_spalte_datum a")
+            if post_date_link:
+                yield ResultRow(
+                    post_date_link.attributes.get("href"), post_date_link.text(deep=True)
+                )
+
+    def next_page_href(self, tree):
+        pagination = tree.css_first("ul.pagination")
+        if pagination:
+            page_links = pagination.css("a")
+            if page_links:
+                return page_links[-1].attributes.get("href")
+        return None
+
+    def search_results(self, tree):
+        return list(self.iter_result_rows(tree)), self.next_page_href(tree)
+
+    def contact_href(self, tree):
+        contact_button = tree.css_first('a[class="{}"]'.format(CONTACT_BUTTON_CLASS))
+        return contact_button.attributes.get("href") if contact_button else None
+
+    def messenger_form(self, tree):
+        submit_form = tree.css_first("form#messenger_form")
+        if not submit_form:
+            return None
+        fields = dict()
+        for field in submit_form.css("[name]"):
+            fields.setdefault(field.attributes["name"], field.attributes.get("value"))
+        return fields
+
+    def message_recipient(self, tree):
+        label = tree.css_first('.control-label[for="message_input"]')
+        return label.text(deep=True) if label else None
+
+
+PARSERS = {
+    "html.parser": lambda: SoupParser("html.parser"),
+    "lxml": lambda: SoupParser("lxml"),
+    "selectolax": SelectolaxParser,
+}
+
+
+def get_parser(name="html.parser"):
+    try:
+        parser_class = PARSERS[name]
+    except KeyError:
+        raise ValueError(
+            "Unknown parser '{}', choose one of: {}".format(name, ", ".join(PARSERS))
+        )
+    return parser_class()
+
+
+DEFAULT_PARSER = get_parser()
@@ -0,0 +1,120 @@
+import queue
+import itertools
+import threading
+
+from .transport import RequestFailed
+
+_DONE = object()
+# sorts after every ad in the priority queues
+_LAST = (float("inf"),)
+
+
+class MessagePipeline:
+    """
+    Messages a batch of ads with separate fetch, parse and send stages connected by
+    queues, so new ad pages are already being fetched while earlier messages are
+    prepared and sent.
+
+    `concurrency` fetch and send workers run side by side with a single parse worker.
+    The fetch and send stages take the freshest ad waiting first (see
+    `WgGesuchtCrawler.ad_priority`).
+    Every request still goes through the crawler's rate limiter, so the pipeline only
+    fills the gaps the sequential path leaves, it never exceeds the request budget.
+    Each ad goes through the same crawler steps as `email_apartment`.
+    """
+
+    def __init__(self, crawler, concurrency=2):
+        self.crawler = crawler
+        self.logger = crawler.logger
+        self.concurrency = concurrency
+        self._exit = None
+        self._sequence = itertools.count()
+
+    def run(self, ad_list, template_text):
+        fetch_queue = queue.PriorityQueue()
+        parse_queue = queue.Queue(maxsize=self.concurrency * 2)
+        send_queue = queue.PriorityQueue(maxsize=self.concurrency * 2)
+
+        # queue everything up front so the first fetch already gets the freshest ad
+        for ad in ad_list:
+            self.put(fetch_queue, ad)
+
+        stages = [
+            (fetch_queue, self.fetch, parse_queue, self.concurrency),
+            (parse_queue, self.parse, send_queue, 1),
+            (send_queue, self.send, None, self.concurrency),
+        ]
+        workers = [
+            [
+                threading.Thread(
+                    target=self.work,
+                    args=(in_queue, step, out_queue, template_text),
+                    daemon=True,
+                )
+                for _ in range(count)
+            ]
+            for in_queue, step, out_queue, count in stages
+        ]
+        for stage_workers in workers:
+            for worker in stage_workers:
+                worker.start()
+
+        # shut the stages down one after another, once everything upstream is done
+        for (in_queue, step, out_queue, count), stage_workers in zip(stages, workers):
+            for _ in stage_workers:
+                self.put(in_queue, _DONE)
+            for worker in stage_workers:
+                worker.join()
+
+        if self._exit is not None:
+            raise self._exit
+
+    def put(self, out_queue, item):
+        if isinstance(out_queue, queue.PriorityQueue):
+            ad = item[0] if isinstance(item, tuple) else item
+            priority = _LAST if item is _DONE else self.crawler.ad_priority(ad)
+            item = (priority, next(self._sequence), item)
+        out_queue.put(item)
+
+    def get(self, in_queue):
+        item = in_queue.get()
+        if isinstance(in_queue, queue.PriorityQueue):
+            item = item[2]
+        return item
+
+    def work(self, in_queue, step, out_queue, template_text):
+        while True:
+            item = self.get(in_queue)
+            if item is _DONE:
+                return
+            if self._exit is not None:
+                continue
+            try:
+                result = step(item, template_text)
+            except (SystemExit, RequestFailed) as exc:
+                # the crawler stopping or giving up on the search only ends this
+                # thread, so hand it back to the thread that started the pipeline
+                self._exit = exc
+                continue
+            except Exception:
+                self.logger.exception("Could not message %s", item)
+                continue
+            if result is not None and out_queue is not None:
+                self.put(out_queue, result)
+
+    def fetch(self, ad, template_text):
+        ad, submit_form_page = self.crawler.fetch_ad(ad)
+        if submit_form_page is None:
+            return None
+        return ad, submit_form_page
+
+    def parse(self, item, template_text):
+        ad, submit_form_page = item
+        payload = self.crawler.prepare_message(ad, submit_form_page, template_text)
+        if payload is None:
+            return None
+        return ad, payload
+
+    def send(self, item, template_text):
+        ad, payload = item
+        self.crawler.send_message(ad, payload)
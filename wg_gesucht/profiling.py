@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import datetime
+import threading
+import collections
+
+
+class SleepRecorder:
+    """Stands in for `time.sleep`, adds up how long it was asked to sleep and returns at once."""
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+
+    def __call__(self, seconds):
+        self.calls += 1
+        self.total += seconds
+
+
+class StackSampler:
+    """
+    Samples the stacks of all other threads every `interval` seconds, and writes them
+    out in the collapsed format flamegraph.pl and speedscope read ("a;b;c count").
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = list()
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        "{}:{}".format(os.path.basename(code.co_filename), code.co_name)
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write("{} {}\n".format(stack, count))
+
+
+def profile_cycle(crawler, sleep_recorder=None):
+    """
+    Runs a single search under cProfile and the stack sampler, and writes to the
+    crawler's logs folder:
+
+    - profile-<time>.prof, the cProfile stats (for pstats, snakeviz, ...)
+    - profile-<time>.txt, the 40 functions with the highest cumulative time
+    - profile-<time>.collapsed, the sampled stacks, for a flame graph
+
+    The crawler's rate limiter should sleep through `sleep_recorder`, the time it
+    would have slept is logged along with the pause the scheduler would have taken.
+    Returns the path of the .prof file.
+    """
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    base_path = os.path.join(crawler.logs_folder, "profile-{}".format(stamp))
+
+    profiler = cProfile.Profile()
+    started = time.monotonic()
+    with StackSampler() as sampler:
+        profiler.runcall(crawler.run_cycle)
+    duration = time.monotonic() - started
+
+    profiler.dump_stats(base_path + ".prof")
+    with open(base_path + ".txt", "w", encoding="utf-8") as file:
+        stats = pstats.Stats(profiler, stream=file)
+        stats.sort_stats("cumulative").print_stats(40)
+    sampler.write_collapsed(base_path + ".collapsed")
+
+    crawler.logger.warning(
+        "Profiled search took %.1fs, written to %s.prof/.txt/.collapsed",
+        duration,
+        base_path,
+    )
+    if sleep_recorder is not None:
+        crawler.logger.warning(
+            "Skipped %s rate limiter sleeps, %.1fs in total",
+            sleep_recorder.calls,
+            sleep_recorder.total,
+        )
+    crawler.logger.warning(
+        "Skipped the pause before the next search, %.1fs",
+        crawler.scheduler.next_delay(duration),
+    )
+    return base_path + ".prof"
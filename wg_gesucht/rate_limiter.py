@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import collections
+
+from .atomic_write import write_atomically
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by every request the crawler makes.
+
+    Tokens are added at `rate` per second up to `burst`, so time spent idle (parsing,
+    sending messages, waiting for the next search) counts towards the budget rather
+    than being added on top of a fixed sleep. When a request has to wait, a random
+    extra delay of up to `jitter` seconds is added so requests don't arrive at a
+    perfectly regular interval.
+    """
+
+    def __init__(
+        self,
+        rate=0.2,
+        burst=2,
+        jitter=3.0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        window=20,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.jitter = jitter
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._recent = collections.deque(maxlen=window)
+
+        self.requests = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def reserve(self):
+        """
+        Takes a token and returns how many seconds the caller has to wait before
+        making its request, without sleeping. Used directly by the async engine.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+
+            delay = 0.0
+            if self._tokens < 0:
+                delay = -self._tokens / self.rate + random.uniform(0, self.jitter)
+                self.waits += 1
+                self.total_wait += delay
+                self.max_wait = max(self.max_wait, delay)
+            self.requests += 1
+            self._recent.append(now + delay)
+        return delay
+
+    def set_rate(self, rate):
+        with self._lock:
+            # tokens earned so far still count at the old rate
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self.rate = rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            self._sleep(delay)
+        return delay
+
+    @property
+    def current_rate(self):
+        """Requests per second over the most recent requests."""
+        with self._lock:
+            if len(self._recent) < 2:
+                return 0.0
+            elapsed = self._recent[-1] - self._recent[0]
+            if elapsed <= 0:
+                return 0.0
+            return (len(self._recent) - 1) / elapsed
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "current_rate": self.current_rate,
+            "requests": self.requests,
+            "waits": self.waits,
+            "total_wait": self.total_wait,
+            "max_wait": self.max_wait,
+            "mean_wait": self.total_wait / self.waits if self.waits else 0.0,
+        }
+
+
+class AdaptiveThrottle:
+    """
+    Adjusts the rate of a `TokenBucket` to what wg-gesucht tolerates, AIMD style like
+    TCP congestion control.
+
+    Every `clean_requests` requests in a row without a reCAPTCHA or an HTTP 429 raise
+    the rate by `increase` requests per second, up to `max_rate`. A reCAPTCHA or 429
+    multiplies it by `decrease`, down to `min_rate`, and pauses all requests for
+    `pause` seconds, doubling up to `max_pause` while requests keep being refused.
+    The learned rate is saved to `state_file` and picked up again on the next start,
+    if it is slower than the bucket's rate then.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        min_rate=None,
+        max_rate=None,
+        increase=0.005,
+        decrease=0.5,
+        clean_requests=20,
+        pause=900,
+        max_pause=3600,
+        state_file=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        logger=None,
+    ):
+        self.bucket = bucket
+        self.min_rate = min_rate if min_rate is not None else bucket.rate / 8
+        self.max_rate = max_rate if max_rate is not None else bucket.rate * 2
+        self.increase = increase
+        self.decrease = decrease
+        self.clean_requests = clean_requests
+        self.pause = pause
+        self.max_pause = max_pause
+        self.state_file = state_file
+        self._clock = clock
+        # called with the seconds to pause, returns True to stop waiting for good
+        self.sleep = sleep
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        self.clean = 0
+        self.current_pause = pause
+        self.paused_until = 0.0
+        # number of congestion events so far, see `congestion`
+        self.events = 0
+
+        saved_rate = self.load()
+        # never faster than configured, the user may have slowed it down since
+        if saved_rate is not None and saved_rate < bucket.rate:
+            bucket.set_rate(max(saved_rate, self.min_rate))
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def success(self):
+        with self._lock:
+            self.clean += 1
+            self.current_pause = self.pause
+            if self.clean < self.clean_requests or self.rate >= self.max_rate:
+                return
+            self.clean = 0
+            self.bucket.set_rate(min(self.rate + self.increase, self.max_rate))
+            self.save()
+
+    def congestion(self, reason, events_seen):
+        """
+        Slows down after a refused request, unless another request already did since
+        `events_seen` (the value of `events` when the request was made), so requests
+        which were in flight together only count once.
+        """
+        with self._lock:
+            if self.events != events_seen:
+                return
+            self.events += 1
+            self.clean = 0
+            self.bucket.set_rate(max(self.rate * self.decrease, self.min_rate))
+            self.paused_until = self._clock() + self.current_pause
+            self.logger.warning(
+                "%s detected, pausing for %d minutes and slowing down to %.1f requests/min",
+                reason,
+                self.current_pause // 60,
+                self.rate * 60,
+            )
+            self.current_pause = min(self.current_pause * 2, self.max_pause)
+            self.save()
+
+    def remaining(self):
+        """Seconds left of the current pause."""
+        return max(self.paused_until - self._clock(), 0.0)
+
+    def wait(self):
+        """Sleeps out the current pause, returns True if `sleep` says to stop."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            return False
+        return bool(self.sleep(remaining))
+
+    def load(self):
+        if not self.state_file or not os.path.isfile(self.state_file):
+            return None
+        try:
+            with open(self.state_file, encoding="utf-8") as file:
+                return float(json.load(file)["rate"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self):
+        if not self.state_file:
+            return
+        write_atomically(self.state_file, json.dumps({"rate": self.rate}).encode("utf-8"))
@@ -0,0 +1,117 @@
+import json
+import threading
+
+from .atomic_write import write_atomically
+
+STAGES = ("login", "template", "filters", "results", "ad", "form", "send")
+FIELDS = ("requests", "sleep", "network", "bytes", "parse")
+
+
+class RequestTiming:
+    """Where the time of a single request went, all durations in seconds."""
+
+    __slots__ = ("stage", "url", "status", "sleep", "network", "bytes", "parse")
+
+    def __init__(self, stage, url):
+        self.stage = stage
+        self.url = url
+        self.status = None
+        # waiting for the rate limiter
+        self.sleep = 0.0
+        # from sending the request until the whole body was read
+        self.network = 0.0
+        self.bytes = 0
+        # building parse trees of the page, added as the page gets parsed
+        self.parse = 0.0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RequestTimings:
+    """
+    Collects a `RequestTiming` for every request of the running search, labeled by
+    the stage of the search it belongs to (one of `STAGES`).
+
+    `end_cycle` sums them up per stage and adds them to the running totals, which can
+    be written out as a Prometheus text file (for node_exporter's textfile collector).
+    The individual requests can be appended to a JSON lines file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = list()
+        self.cycles = 0
+        self.totals = {stage: dict.fromkeys(FIELDS, 0) for stage in STAGES}
+
+    def start(self, stage, url):
+        timing = RequestTiming(stage, url)
+        with self._lock:
+            self._records.append(timing)
+        return timing
+
+    @staticmethod
+    def summary(records):
+        stages = dict()
+        for timing in records:
+            stage = stages.setdefault(timing.stage, dict.fromkeys(FIELDS, 0))
+            stage["requests"] += 1
+            for name in FIELDS[1:]:
+                stage[name] += getattr(timing, name)
+        return stages
+
+    def end_cycle(self):
+        """Returns the requests of the search which just ended, and their summary."""
+        with self._lock:
+            records, self._records = self._records, list()
+            self.cycles += 1
+            summary = self.summary(records)
+            for stage, values in summary.items():
+                totals = self.totals.setdefault(stage, dict.fromkeys(FIELDS, 0))
+                for name in FIELDS:
+                    totals[name] += values[name]
+        return records, summary
+
+    def write_json_lines(self, path, records, cycle):
+        with open(path, "a", encoding="utf-8") as file:
+            for timing in records:
+                line = timing.as_dict()
+                line["cycle"] = cycle
+                file.write(json.dumps(line) + "\n")
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP wg_gesucht_cycles_total Searches run.",
+            "# TYPE wg_gesucht_cycles_total counter",
+            "wg_gesucht_cycles_total {}".format(self.cycles),
+            "# HELP wg_gesucht_requests_total Requests made, by stage of the search.",
+            "# TYPE wg_gesucht_requests_total counter",
+        ]
+        totals = sorted(self.totals.items())
+        for stage, values in totals:
+            lines.append(
+                'wg_gesucht_requests_total{{stage="{}"}} {}'.format(stage, values["requests"])
+            )
+        lines += [
+            "# HELP wg_gesucht_request_seconds_total Time spent, by stage and phase.",
+            "# TYPE wg_gesucht_request_seconds_total counter",
+        ]
+        for stage, values in totals:
+            for phase in ("sleep", "network", "parse"):
+                lines.append(
+                    'wg_gesucht_request_seconds_total{{stage="{}",phase="{}"}} '
+                    "{:.6f}".format(stage, phase, values[phase])
+                )
+        lines += [
+            "# HELP wg_gesucht_response_bytes_total Response body bytes, by stage.",
+            "# TYPE wg_gesucht_response_bytes_total counter",
+        ]
+        for stage, values in totals:
+            lines.append(
+                'wg_gesucht_response_bytes_total{{stage="{}"}} {}'.format(stage, values["bytes"])
+            )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # a scrape never sees half a file
+        write_atomically(path, self.prometheus_text().encode("utf-8"))
@@ -0,0 +1,97 @@
+import time
+import random
+import signal
+import logging
+import datetime
+import threading
+
+
+class Scheduler:
+    """
+    Runs `task` every `interval` seconds, give or take `jitter`, until stopped.
+
+    The time the task itself took is subtracted from the pause, so cycles start at a
+    steady rate however long a search takes. SIGTERM stops the loop once the running
+    cycle has finished.
+    """
+
+    def __init__(
+        self, task, interval=270, jitter=30, logger=None, clock=time.monotonic
+    ):
+        self.task = task
+        self.interval = interval
+        self.jitter = jitter
+        self.logger = logger or logging.getLogger(__name__)
+        self._clock = clock
+        self._stop = threading.Event()
+
+        self.cycles = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_delay = 0.0
+
+    def stop(self, *args):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def wait(self, seconds):
+        """Sleeps for `seconds`, returns True straight away if stopped meanwhile."""
+        return self._stop.wait(seconds)
+
+    def install_signal_handlers(self):
+        # signal handlers can only be installed from the main thread
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self._handle_sigterm)
+
+    def _handle_sigterm(self, signum, frame):
+        self.logger.warning("SIGTERM received, stopping after the current search")
+        self.stop()
+
+    def next_delay(self, duration):
+        delay = self.interval + random.uniform(-self.jitter, self.jitter) - duration
+        return max(delay, 0.0)
+
+    def run(self, max_cycles=None):
+        while not self._stop.is_set():
+            started = self._clock()
+            self.task()
+            self.record(self._clock() - started)
+
+            if max_cycles and self.cycles >= max_cycles:
+                break
+
+            self.last_delay = self.next_delay(self.last_duration)
+            resume_at = datetime.datetime.now() + datetime.timedelta(
+                seconds=self.last_delay
+            )
+            self.logger.info(
+                "Search took %.1fs (mean %.1fs, max %.1fs), resuming at %s",
+                self.last_duration,
+                self.mean_duration,
+                self.max_duration,
+                resume_at.strftime("%H:%M:%S"),
+            )
+            self._stop.wait(self.last_delay)
+
+    def record(self, duration):
+        self.cycles += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_duration += duration
+
+    @property
+    def mean_duration(self):
+        return self.total_duration / self.cycles if self.cycles else 0.0
+
+    def stats(self):
+        return {
+            "cycles": self.cycles,
+            "last_duration": self.last_duration,
+            "mean_duration": self.mean_duration,
+            "max_duration": self.max_duration,
+            "last_delay": self.last_delay,
+        }
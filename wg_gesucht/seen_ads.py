@@ -0,0 +1,165 @@
+import os
+import csv
+import sqlite3
+import threading
+
+from .ads import ad_key
+
+CSV_HEADER = ["WG Links", "Name", "Ad Title"]
+
+
+class SeenAdsStore:
+    """
+    Persistent record of the ads that have already been messaged.
+
+    Rows are kept in a SQLite database and the key of every ad (see `ads.ad_key`) is
+    loaded once into an in-memory set, so membership checks are O(1) and do not touch
+    the disk. An ad counts as seen under any of its URLs. Rows written before the keys
+    existed get theirs when the database is opened.
+    The 'WG Ad Links.csv' file is kept up to date as an optional export. An existing
+    one (`csv_import_path`, the export by default) is imported the first time the
+    database is created, whether it is still exported or not.
+
+    New ads count as seen straight away, but are only written out by `flush`, in one
+    transaction, once `flush_size` of them are waiting or when the crawler flushes at
+    the end of a search. `close` flushes as well.
+
+    The newest ad seen in each filter (its watermark) is kept alongside, so
+    the next search can stop paging once it reaches ads it has already seen.
+    """
+
+    def __init__(self, db_path, csv_export_path=None, flush_size=50, csv_import_path=None):
+        self.db_path = db_path
+        self.csv_export_path = csv_export_path
+        csv_import_path = csv_import_path or csv_export_path
+        self.flush_size = flush_size
+        self._lock = threading.Lock()
+        self._pending = list()
+
+        new_db = not os.path.isfile(db_path)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_ads "
+            "(url TEXT PRIMARY KEY, submitter TEXT, title TEXT, ad_key TEXT)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(seen_ads)")]
+        if "ad_key" not in columns:
+            self._conn.execute("ALTER TABLE seen_ads ADD COLUMN ad_key TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS filter_watermarks "
+            "(filter_url TEXT PRIMARY KEY, ad_id INTEGER, post_date TEXT)"
+        )
+        self._conn.commit()
+        self.add_missing_keys()
+
+        if new_db and csv_import_path and os.path.isfile(csv_import_path):
+            self.import_csv(csv_import_path)
+
+        self._keys = {row[0] for row in self._conn.execute("SELECT ad_key FROM seen_ads")}
+        self._watermarks = {
+            row[0]: (row[1], row[2])
+            for row in self._conn.execute(
+                "SELECT filter_url, ad_id, post_date FROM filter_watermarks"
+            )
+        }
+
+    def __contains__(self, url):
+        return ad_key(url) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, url, submitter, title):
+        key = ad_key(url)
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            self._pending.append((url, submitter, title, key))
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Writes the ads added since the last flush, returns how many there were."""
+        with self._lock:
+            rows, self._pending = self._pending, list()
+            if not rows:
+                return 0
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO seen_ads (url, submitter, title, ad_key) "
+                        "VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+            except sqlite3.Error:
+                # keep them for the next flush
+                self._pending[:0] = rows
+                raise
+        if self.csv_export_path:
+            self.append_csv(self.csv_export_path, [row[:3] for row in rows])
+        return len(rows)
+
+    def add_missing_keys(self):
+        """Gives the rows written before ads had keys theirs, returns how many."""
+        with self._lock:
+            rows = [
+                (ad_key(url), url)
+                for (url,) in self._conn.execute(
+                    "SELECT url FROM seen_ads WHERE ad_key IS NULL"
+                )
+            ]
+            with self._conn:
+                self._conn.executemany("UPDATE seen_ads SET ad_key = ? WHERE url = ?", rows)
+        return len(rows)
+
+    def watermark(self, filter_url):
+        """Returns (ad_id, post_date) of the newest ad seen in a filter, or None."""
+        return self._watermarks.get(filter_url)
+
+    def set_watermark(self, filter_url, ad_id, post_date):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO filter_watermarks (filter_url, ad_id, post_date) "
+                "VALUES (?, ?, ?)",
+                (filter_url, ad_id, post_date),
+            )
+            self._conn.commit()
+            self._watermarks[filter_url] = (ad_id, post_date)
+
+    def import_csv(self, path):
+        with open(path, "rt", newline="", encoding="utf-8") as file:
+            rows = [
+                (
+                    row[0],
+                    row[1] if len(row) > 1 else "",
+                    row[2] if len(row) > 2 else "",
+                    ad_key(row[0]),
+                )
+                for row in csv.reader(file)
+                if row and row != CSV_HEADER
+            ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_ads (url, submitter, title, ad_key) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def append_csv(self, path, rows):
+        """Adds rows to the end of the CSV export, in one write."""
+        write_header = not os.path.isfile(path)
+        with open(path, "a", newline="", encoding="utf-8") as file:
+            csv_file_write = csv.writer(file)
+            if write_header:
+                csv_file_write.writerow(CSV_HEADER)
+            csv_file_write.writerows(rows)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
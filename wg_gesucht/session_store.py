@@ -0,0 +1,40 @@
+import json
+import time
+
+from .atomic_write import write_atomically
+
+COOKIE_FIELDS = ("name", "value", "domain", "path", "expires", "secure")
+
+
+def save_cookies(session, path):
+    """Writes the session's cookies to `path` as JSON, readable by the owner only."""
+    cookies = [
+        {field: getattr(cookie, field) for field in COOKIE_FIELDS}
+        for cookie in session.cookies
+    ]
+    write_atomically(path, json.dumps(cookies).encode("utf-8"), permissions=0o600)
+
+
+def load_cookies(session, path):
+    """Adds the unexpired cookies saved in `path` to the session, returns how many."""
+    try:
+        with open(path, encoding="utf-8") as file:
+            cookies = json.load(file)
+    except (OSError, ValueError):
+        return 0
+
+    now = time.time()
+    loaded = 0
+    for cookie in cookies:
+        if cookie.get("expires") is not None and cookie["expires"] <= now:
+            continue
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie["domain"],
+            path=cookie["path"],
+            expires=cookie["expires"],
+            secure=cookie["secure"],
+        )
+        loaded += 1
+    return loaded
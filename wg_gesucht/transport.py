@@ -0,0 +1,108 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class RequestFailed(Exception):
+    """A request which timed out or couldn't connect, even after its retries."""
+
+
+class TimeoutSession(requests.Session):
+    """A requests session which applies a default (connect, read) timeout to every call."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def build_retry(retries, backoff_factor):
+    """Retries idempotent requests only, never the login or message POSTs."""
+    kwargs = dict(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,
+    )
+    methods = frozenset(["GET", "HEAD"])
+    try:
+        return Retry(allowed_methods=methods, **kwargs)
+    except TypeError:  # urllib3 < 1.26
+        return Retry(method_whitelist=methods, **kwargs)
+
+
+def enable_http2():
+    """
+    Switches urllib3 to HTTP/2 where it supports it (urllib3 >= 2.3 with 'h2'
+    installed). Returns whether HTTP/2 could be enabled.
+    """
+    try:
+        import urllib3.http2
+
+        urllib3.http2.inject_into_urllib3()
+    except ImportError:
+        return False
+    return True
+
+
+def create_session(
+    connect_timeout=10,
+    read_timeout=30,
+    pool_size=10,
+    retries=3,
+    backoff_factor=1.0,
+):
+    session = TimeoutSession((connect_timeout, read_timeout))
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=build_retry(retries, backoff_factor),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ConnectionMetrics:
+    """
+    Counts requests and newly opened connections in the session's urllib3 pools, so
+    each search can report how many requests reused a kept-alive connection instead
+    of paying for a new TCP and TLS handshake.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._last = (0, 0)
+
+    def totals(self):
+        requests_made = connections_opened = 0
+        seen = set()
+        for adapter in self.session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                requests_made += pool.num_requests
+                connections_opened += pool.num_connections
+        return requests_made, connections_opened
+
+    def cycle(self):
+        """Returns the counts since the previous call."""
+        requests_made, connections_opened = self.totals()
+        last_requests, last_connections = self._last
+        self._last = (requests_made, connections_opened)
+
+        requests_made -= last_requests
+        connections_opened -= last_connections
+        return {
+            "requests": requests_made,
+            "connections_opened": connections_opened,
+            "connections_reused": max(requests_made - connections_opened, 0),
+        }